@@ -0,0 +1,206 @@
+"""Benchmark offline do caminho rolagem -> embed (não conecta ao Discord)
+
+Uso:
+    python benchmark.py                                # varre a grade completa (1-20 dados, fome 0-5)
+    python benchmark.py --iteracoes 500                # lotes menores (mais rápido, mais ruído)
+    python benchmark.py --repeticoes 9                 # mais lotes por ponto da grade
+    python benchmark.py --processos 5                  # mais processos (fica o melhor de todos)
+    python benchmark.py --detalhado                    # mostra cada combinação de dados e fome
+    python benchmark.py --salvar referencia.json       # salva os números como referência
+    python benchmark.py --comparar referencia.json --limite 0.15
+                                                       # falha (código 1) se piorar mais de 15%
+"""
+import argparse
+import gc
+import json
+import multiprocessing
+import sys
+import time
+import tracemalloc
+from concurrent.futures import ProcessPoolExecutor
+
+import bot
+
+# Etapas medidas: nome -> função que recebe (dados, dificuldade, fome, resultado pré-rolado)
+STAGES = {
+    'roll_vampire_dice': lambda dice, difficulty, hunger, result: bot.roll_vampire_dice(dice, difficulty, hunger),
+    'VampireDiceResult': lambda dice, difficulty, hunger, result: bot.VampireDiceResult(difficulty, hunger, result.results),
+    'format_dice_results': lambda dice, difficulty, hunger, result: bot.format_dice_results(result),
+    'create_result_embed': lambda dice, difficulty, hunger, result: bot.create_result_embed(result),
+    'pipeline': lambda dice, difficulty, hunger, result: bot.create_result_embed(bot.roll_vampire_dice(dice, difficulty, hunger)),
+}
+
+DIFFICULTY = 3
+
+def parameter_grid():
+    """Todas as paradas aceitas pelo bot: 1-20 dados, fome 0-5 (nunca maior que os dados)"""
+    for dice in range(1, 21):
+        for hunger in range(0, min(5, dice) + 1):
+            yield dice, hunger
+
+def percentile(sorted_values, quantile):
+    index = min(len(sorted_values) - 1, max(0, round(quantile * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+def measure_stages(iterations, repeats):
+    """Melhor tempo (ns) de um lote de `iterations` chamadas em cada ponto da grade, por etapa
+
+    Cada chamada leva poucos microssegundos, então o relógio mede lotes e, de `repeats` lotes,
+    fica o mais rápido (o menos afetado por ruído da máquina). Cada rodada passa por todas as
+    etapas e pontos da grade, para uma fase lenta da máquina não cair em todos os lotes de uma
+    mesma etapa.
+    """
+    grid = [
+        (dice, hunger, [bot.roll_vampire_dice(dice, DIFFICULTY, hunger) for _ in range(iterations)])
+        for dice, hunger in parameter_grid()
+    ]
+    best = {stage: [None] * len(grid) for stage in STAGES}
+
+    gc.disable()
+    try:
+        for _ in range(repeats):
+            for stage, func in STAGES.items():
+                timings = best[stage]
+                for index, (dice, hunger, results) in enumerate(grid):
+                    start = time.perf_counter_ns()
+                    for result in results:
+                        func(dice, DIFFICULTY, hunger, result)
+                    elapsed = time.perf_counter_ns() - start
+                    if timings[index] is None or elapsed < timings[index]:
+                        timings[index] = elapsed
+    finally:
+        gc.enable()
+    return best
+
+def summarize(best, iterations):
+    """(resumo, linhas por ponto da grade) a partir dos melhores lotes de uma etapa
+
+    p50 e p99 são tomados entre os pontos da grade.
+    """
+    per_call = []
+    rows = []
+    for (dice, hunger), elapsed in zip(parameter_grid(), best):
+        call_ns = elapsed / iterations
+        per_call.append(call_ns)
+        rows.append((dice, hunger, 1e9 / call_ns, call_ns / 1000))
+
+    total_ns = sum(per_call)
+    per_call.sort()
+    summary = {
+        'ops_per_sec': len(per_call) * 1e9 / total_ns,
+        'p50_us': percentile(per_call, 0.5) / 1000,
+        'p99_us': percentile(per_call, 0.99) / 1000,
+    }
+    return summary, rows
+
+def measure_memory(samples=2000):
+    """Bytes retidos por resultado guardado e pico alocado por rolagem completa (com embed)"""
+    gc.collect()
+    tracemalloc.start()
+    try:
+        before = tracemalloc.get_traced_memory()[0]
+        kept = [bot.roll_vampire_dice(20, DIFFICULTY, 5) for _ in range(samples)]
+        retained = (tracemalloc.get_traced_memory()[0] - before) / samples
+        del kept
+
+        # Pico de cada rolagem isolada (mediana, para ignorar o aquecimento dos caches)
+        gc.collect()
+        peaks = []
+        for _ in range(samples):
+            tracemalloc.reset_peak()
+            before = tracemalloc.get_traced_memory()[0]
+            bot.create_result_embed(bot.roll_vampire_dice(20, DIFFICULTY, 5))
+            peaks.append(tracemalloc.get_traced_memory()[1] - before)
+        peaks.sort()
+    finally:
+        tracemalloc.stop()
+    return {'retained_bytes_per_result': retained, 'peak_bytes_per_roll': percentile(peaks, 0.5)}
+
+def measure_in_processes(iterations, repeats, processes):
+    """measure_stages em `processes` processos novos, um de cada vez; fica o melhor lote de todos
+
+    O desempenho muda de um processo para outro (disposição da memória, caches), então um
+    processo só pode sair lento do começo ao fim e parecer uma regressão.
+    """
+    best = None
+    for _ in range(processes):
+        with ProcessPoolExecutor(1, mp_context=multiprocessing.get_context('spawn')) as executor:
+            timings = executor.submit(measure_stages, iterations, repeats).result()
+        if best is None:
+            best = timings
+        else:
+            for stage, values in timings.items():
+                best[stage] = [min(pair) for pair in zip(best[stage], values)]
+    return best
+
+def run(iterations, repeats, processes, detailed):
+    report = {'stages': {}, 'memory': measure_memory()}
+
+    print(f"🎲 Benchmark rolagem -> embed ({iterations} iterações por lote, melhor de {repeats} lotes "
+          f"em {processes} processos por ponto da grade)\n")
+    print(f"{'etapa':<22} {'ops/s':>12} {'p50 (µs)':>10} {'p99 (µs)':>10}")
+    best = measure_in_processes(iterations, repeats, processes)
+    for stage in STAGES:
+        summary, rows = summarize(best[stage], iterations)
+        report['stages'][stage] = summary
+        print(f"{stage:<22} {summary['ops_per_sec']:>12,.0f} {summary['p50_us']:>10.2f} {summary['p99_us']:>10.2f}")
+        if detailed:
+            for dice, hunger, ops, call_us in rows:
+                print(f"    {dice:>2} dados, fome {hunger}: {ops:>12,.0f} ops/s  {call_us:.2f} µs por chamada")
+
+    memory = report['memory']
+    print(f"\n💾 Memória retida por resultado: {memory['retained_bytes_per_result']:.0f} bytes")
+    print(f"💾 Pico alocado por rolagem com embed: {memory['peak_bytes_per_roll']} bytes")
+    return report
+
+def compare(report, baseline, threshold):
+    """Lista as métricas que pioraram além do limite em relação à referência"""
+    regressions = []
+    for stage, summary in report['stages'].items():
+        reference = baseline.get('stages', {}).get(stage)
+        if reference is None:
+            continue
+        if summary['ops_per_sec'] < reference['ops_per_sec'] * (1 - threshold):
+            regressions.append(f"{stage}: ops/s {reference['ops_per_sec']:,.0f} -> {summary['ops_per_sec']:,.0f}")
+        # p99 entre os pontos da grade é praticamente o pior ponto e varia demais para reprovar
+        # sozinho; p50 e ops/s resumem todos os pontos
+        if summary['p50_us'] > reference['p50_us'] * (1 + threshold):
+            regressions.append(f"{stage}: p50 {reference['p50_us']:.2f} µs -> {summary['p50_us']:.2f} µs")
+
+    for key, value in report['memory'].items():
+        reference = baseline.get('memory', {}).get(key)
+        if reference is not None and value > reference * (1 + threshold):
+            regressions.append(f"{key}: {reference:.0f} -> {value:.0f} bytes")
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark offline do caminho rolagem -> embed")
+    parser.add_argument('--iteracoes', type=int, default=500, help="chamadas por lote medido")
+    parser.add_argument('--repeticoes', type=int, default=5, help="lotes por ponto da grade (vale o mais rápido)")
+    parser.add_argument('--processos', type=int, default=3, help="processos que repetem a medição (vale o mais rápido)")
+    parser.add_argument('--detalhado', action='store_true', help="mostra cada combinação de dados e fome")
+    parser.add_argument('--salvar', metavar='ARQUIVO', help="salva os resultados em JSON")
+    parser.add_argument('--comparar', metavar='ARQUIVO', help="compara com resultados salvos anteriormente")
+    parser.add_argument('--limite', type=float, default=0.10, help="piora máxima aceita na comparação (0.10 = 10%%)")
+    args = parser.parse_args()
+
+    report = run(args.iteracoes, args.repeticoes, args.processos, args.detalhado)
+
+    if args.salvar:
+        with open(args.salvar, 'w', encoding='utf-8') as file:
+            json.dump(report, file, indent=2)
+        print(f"\n📁 Resultados salvos em {args.salvar}")
+
+    if args.comparar:
+        with open(args.comparar, encoding='utf-8') as file:
+            baseline = json.load(file)
+        regressions = compare(report, baseline, args.limite)
+        if regressions:
+            print(f"\n❌ Regressões acima de {args.limite:.0%}:")
+            for regression in regressions:
+                print(f"   - {regression}")
+            sys.exit(1)
+        print(f"\n✅ Nenhuma regressão acima de {args.limite:.0%}")
+
+if __name__ == "__main__":
+    main()
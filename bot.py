@@ -1,58 +1,182 @@
+import time
+
+# Início do processo, para medir o tempo até o bot ficar pronto (inclui importar o discord.py)
+STARTED_AT = time.perf_counter()
+
 import discord
 from discord.ext import commands
 from discord import app_commands
-import random
+import asyncio
+import atexit
+import hashlib
+import json
+import multiprocessing
 import os
+import re
+import shutil
+import signal
+import sqlite3
+import sys
+import tempfile
+import unicodedata
+import zipfile
+from array import array
+from collections import Counter, OrderedDict, deque, namedtuple
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from functools import lru_cache, wraps
 from dotenv import load_dotenv
 
+from dice_batch import (
+    DIE_FACES, DIE_REJECTED, simulate_vampire_dice,
+    OUTCOME_FAILURE, OUTCOME_SUCCESS, OUTCOME_BESTIAL_FAILURE, OUTCOME_BESTIAL_SUCCESS,
+)
+
 # Carregar variáveis de ambiente
 load_dotenv()
 
+# Configuração de shards (definida pelo launcher.py em implantações com vários processos)
+# SHARD_COUNT: total de shards do bot | SHARD_IDS: shards deste processo, ex. "0,1,2,3"
+# SHARDING=auto: um processo com a quantidade de shards recomendada pelo Discord
+SHARD_COUNT = int(os.getenv('SHARD_COUNT', '0')) or None
+SHARD_IDS = [int(shard_id) for shard_id in os.getenv('SHARD_IDS', '').split(',') if shard_id.strip()] or None
+HEALTH_DIR = os.getenv('HEALTH_DIR')
+HEALTH_INTERVAL = float(os.getenv('HEALTH_INTERVAL', '15'))
+
 # Configuração do bot
 intents = discord.Intents.default()
 intents.message_content = True
-bot = commands.Bot(command_prefix='!', intents=intents)
+if SHARD_COUNT or os.getenv('SHARDING') == 'auto':
+    bot = commands.AutoShardedBot(command_prefix='!', intents=intents, shard_count=SHARD_COUNT, shard_ids=SHARD_IDS)
+else:
+    bot = commands.Bot(command_prefix='!', intents=intents)
+
+def guild_shard(guild_id):
+    """Shard que recebe os eventos de um servidor (mesma fórmula do Discord; DMs vão para o shard 0)"""
+    if not guild_id or not SHARD_COUNT:
+        return 0
+    return (guild_id >> 22) % SHARD_COUNT
+
+def owns_guild(guild_id):
+    """Se este processo é o responsável pelo estado do servidor"""
+    return SHARD_IDS is None or guild_shard(guild_id) in SHARD_IDS
 
 class VampireDiceResult:
-    def __init__(self, dice_count, difficulty, hunger, results, hunger_dice_results, title=None):
-        self.dice_count = dice_count
+    """Resultado de uma rolagem guardado de forma compacta (um byte por dado)"""
+
+    __slots__ = (
+        'results', 'difficulty', 'hunger', 'title',
+        'regular_successes', 'critical_successes', 'total_ones', 'successes',
+        'success', 'bestial_failure', 'bestial_success', 'rng_position',
+        'hunger_one', 'hunger_ten',
+    )
+
+    def __init__(self, difficulty, hunger, results, title=None, rng_position=None):
+        # Os primeiros `hunger` dados são os dados de fome
+        self.results = bytes(results)
         self.difficulty = difficulty
         self.hunger = hunger
-        self.results = results
-        self.hunger_dice_results = hunger_dice_results
         self.title = title
+        # (sequência, posição) de onde os dados saíram, para reproduzir a rolagem em /verificar
+        self.rng_position = rng_position
+
+        results = self.results
         
         # Calcular sucessos brutos
         # 6-9 = 1 sucesso cada, 10 = 2 sucessos cada
-        regular_successes = sum(1 for roll in results if 6 <= roll <= 9)
-        critical_successes = sum(2 for roll in results if roll == 10)
-        raw_successes = regular_successes + critical_successes
+        self.regular_successes = results.count(6) + results.count(7) + results.count(8) + results.count(9)
+        self.critical_successes = results.count(10)  # Quantidade de 10s
         
         # Calcular 1s em toda a parada (reduzem sucessos)
-        total_ones = sum(1 for roll in results if roll == 1)
+        self.total_ones = results.count(1)
         
+        # 1s e 10s nos dados de fome (busca só no trecho dos dados de fome, sem cópia);
+        # dados de fome nunca são rerrolados, então isso vale para toda a vida do resultado
+        self.hunger_one = results.find(1, 0, hunger) != -1
+        self.hunger_ten = results.find(10, 0, hunger) != -1
+        
+        self._settle()
+
+    def _settle(self):
+        """Recalcula o resultado a partir dos contadores, sem olhar os dados"""
         # Sucessos finais = sucessos brutos - 1s
-        self.regular_successes = regular_successes
-        self.critical_successes = critical_successes // 2  # Quantidade de 10s
-        self.raw_successes = raw_successes
-        self.total_ones = total_ones
-        self.successes = max(0, raw_successes - total_ones)
+        self.successes = max(0, self.raw_successes - self.total_ones)
         
         # Verificar se atingiu a dificuldade
-        self.success = self.successes >= difficulty
+        self.success = self.successes >= self.difficulty
         
-        # Verificar falha bestial
-        self.bestial_failure = False
-        if not self.success and hunger > 0:
-            self.bestial_failure = any(roll == 1 for roll in hunger_dice_results)
-        
-        # Verificar sucesso bestial  
-        self.bestial_success = False
-        if not self.success and hunger > 0:
-            self.bestial_success = any(roll == 10 for roll in hunger_dice_results)
+        # Verificar falha e sucesso bestial
+        self.bestial_failure = not self.success and self.hunger_one
+        self.bestial_success = not self.success and self.hunger_ten
+
+    def _count_die(self, die, step):
+        if die == 10:
+            self.critical_successes += step
+        elif die >= 6:
+            self.regular_successes += step
+        elif die == 1:
+            self.total_ones += step
 
-def roll_vampire_dice(dice_count, difficulty, hunger, title=None):
-    """Rola os dados seguindo as regras de Vampiro: A Máscara 5ª ed"""
+    def willpower_targets(self):
+        """Dados normais que valem a pena rerrolar com Força de Vontade: 1s primeiro, depois falhas"""
+        results = self.results
+        failures = sorted((results[index], index) for index in range(self.hunger, len(results)) if results[index] < 6)
+        return [index for _, index in failures[:WILLPOWER_REROLL_LIMIT]]
+
+    def reroll(self, positions, dice):
+        """Força de Vontade: troca só os dados em `positions` e ajusta os contadores de cada um"""
+        if len(positions) > WILLPOWER_REROLL_LIMIT:
+            raise ValueError(f"Força de Vontade rerrola no máximo {WILLPOWER_REROLL_LIMIT} dados")
+        results = self.results
+        if not isinstance(results, bytearray):
+            results = self.results = bytearray(results)
+        for position, die in zip(positions, dice):
+            if position < self.hunger:
+                raise ValueError("Dados de fome não podem ser rerrolados")
+            self._count_die(results[position], -1)
+            results[position] = die
+            self._count_die(die, 1)
+        self._settle()
+
+    @property
+    def dice_count(self):
+        return len(self.results)
+
+    @property
+    def raw_successes(self):
+        return self.regular_successes + 2 * self.critical_successes
+
+    @property
+    def critical_win(self):
+        """Vitória crítica: teste bem-sucedido com pelo menos um par de 10s"""
+        return self.success and self.critical_successes >= 2
+
+    @property
+    def messy_critical(self):
+        """Crítico bagunçado: vitória crítica em que pelo menos um dos 10s é de um dado de fome"""
+        return self.critical_win and self.hunger_ten
+
+    @property
+    def outcome(self):
+        """Resultado final (OUTCOME_*), com a mesma precedência do embed"""
+        if self.success:
+            return OUTCOME_SUCCESS
+        if self.bestial_failure:
+            return OUTCOME_BESTIAL_FAILURE
+        if self.bestial_success:
+            return OUTCOME_BESTIAL_SUCCESS
+        return OUTCOME_FAILURE
+
+    @property
+    def hunger_dice_results(self):
+        """Dados de fome como uma visão dos primeiros dados, sem copiar"""
+        return memoryview(self.results)[:self.hunger]
+
+def roll_vampire_dice(dice_count, difficulty, hunger, title=None, scope=None):
+    """Rola os dados seguindo as regras de Vampiro: A Máscara 5ª ed
+
+    `scope` escolhe a sequência de dados (ver rng_scope); sem escopo usa a sequência global.
+    """
     
     # Validações
     if dice_count <= 0:
@@ -64,18 +188,1555 @@ def roll_vampire_dice(dice_count, difficulty, hunger, title=None):
     if hunger > dice_count:
         raise ValueError("Nível de fome não pode ser maior que o número de dados")
     
-    # Rolar todos os dados
-    all_results = [random.randint(1, 10) for _ in range(dice_count)]
-    
-    # Separar dados de fome (primeiros X dados)
-    hunger_dice = all_results[:hunger] if hunger > 0 else []
-    
-    return VampireDiceResult(dice_count, difficulty, hunger, all_results, hunger_dice, title)
+    # Rolar todos os dados (os primeiros X dados são os dados de fome)
+    dice, position = dice_rng.draw(scope, dice_count)
+    return VampireDiceResult(difficulty, hunger, dice, title, position)
+
+# Força de Vontade: até 3 dados normais rerrolados, uma vez por rolagem
+WILLPOWER_REROLL_LIMIT = 3
+
+RouseCheck = namedtuple('RouseCheck', 'dice hunger_before hunger_after')
+
+def roll_rouse_checks(hunger, checks=1, scope=None):
+    """Testes de Despertar: um dado por teste; 6 ou mais passa, senão a fome sobe 1 (até 5)"""
+    dice, _ = dice_rng.draw(scope, checks)
+    failures = sum(1 for die in dice if die < 6)
+    return RouseCheck(dice, hunger, min(5, hunger + failures))
+
+def validate_roll(dice_count, difficulty, hunger):
+    """Valida os limites de uma parada; retorna a mensagem de erro ou None"""
+    if dice_count <= 0 or dice_count > 20:
+        return "Número de dados deve estar entre 1 e 20"
+    if difficulty <= 0 or difficulty > 10:
+        return "Dificuldade deve estar entre 1 e 10"
+    if hunger < 0 or hunger > 5:
+        return "Nível de fome deve estar entre 0 e 5"
+    if hunger > dice_count:
+        return "Nível de fome não pode ser maior que o número de dados"
+    return None
+
+# Expressões de rolagem do !vamp
+# Formas aceitas (podem ser combinadas e repetidas para várias paradas na mesma mensagem):
+#   5/3 ou 6/4h2          -> dados/dificuldade[h fome]
+#   7d h2 dif4 "Garras"   -> dados, fome, dificuldade e título entre aspas
+#   6 4 2 Ataque          -> forma antiga: dados dificuldade [fome] [título]
+RollSpec = namedtuple('RollSpec', 'dice_count difficulty hunger title')
+
+MAX_POOLS_PER_MESSAGE = 10  # Limite de embeds por mensagem do Discord
+
+ROLL_TOKEN = re.compile(r"""
+      (?P<pool>(?P<pool_dice>\d+)/(?P<pool_difficulty>\d+)(?:h(?P<pool_hunger>\d+))?)(?!\S)
+    | (?P<dice>\d+)d(?!\S)
+    | h(?P<hunger>\d+)(?!\S)
+    | dif(?P<difficulty>\d+)(?!\S)
+    | "(?P<quoted>[^"]*)"
+    | (?P<number>\d+)(?!\S)
+    | (?P<word>\S+)
+""", re.VERBOSE | re.IGNORECASE)
+
+def parse_roll_expression(text):
+    """Converte uma expressão de rolagem em uma lista de RollSpec já validadas"""
+    pools = []
+    current = None
+
+    def finish():
+        if current['dice'] is None:
+            raise ValueError("Informe o número de dados (ex.: `7d` ou `5/3`)")
+        if current['difficulty'] is None:
+            raise ValueError(f"Informe a dificuldade da parada de {current['dice']} dados (ex.: `dif3` ou `{current['dice']}/3`)")
+        error = validate_roll(current['dice'], current['difficulty'], current['hunger'])
+        if error:
+            raise ValueError(error)
+        if len(pools) >= MAX_POOLS_PER_MESSAGE:
+            raise ValueError(f"Máximo de {MAX_POOLS_PER_MESSAGE} paradas por mensagem")
+        title = current['title'].strip() if current['title'] else None
+        pools.append(RollSpec(current['dice'], current['difficulty'], current['hunger'], title or None))
+
+    for match in ROLL_TOKEN.finditer(text):
+        kind = match.lastgroup
+
+        # `5/3` sempre abre uma parada nova; `7d` abre se a atual já tem dados
+        if current is not None and (kind == 'pool' or (kind == 'dice' and current['dice'] is not None)):
+            finish()
+            current = None
+        if current is None:
+            if kind == 'word':
+                raise ValueError(f"Não entendi `{match.group()}`")
+            current = {'dice': None, 'difficulty': None, 'hunger': 0, 'title': None, 'numbers': 0}
+
+        if kind == 'pool':
+            current['dice'] = int(match['pool_dice'])
+            current['difficulty'] = int(match['pool_difficulty'])
+            current['hunger'] = int(match['pool_hunger'] or 0)
+        elif kind == 'dice':
+            current['dice'] = int(match['dice'])
+        elif kind == 'hunger':
+            current['hunger'] = int(match['hunger'])
+        elif kind == 'difficulty':
+            current['difficulty'] = int(match['difficulty'])
+        elif kind == 'quoted':
+            current['title'] = match['quoted']
+        elif kind == 'number' and current['numbers'] < 3 and current['dice'] is None:
+            current['dice'] = int(match['number'])
+            current['numbers'] += 1
+        elif kind == 'number' and current['numbers'] < 3 and current['difficulty'] is None:
+            current['difficulty'] = int(match['number'])
+            current['numbers'] += 1
+        elif kind == 'number' and current['numbers'] == 2:
+            # Terceiro número da forma antiga (`6 4 2`) é a fome
+            current['hunger'] = int(match['number'])
+            current['numbers'] += 1
+        else:
+            # Forma antiga: o resto da mensagem é o título
+            current['title'] = text[match.start():]
+            break
+
+    if current is None:
+        raise ValueError("Informe pelo menos uma parada (ex.: `5/3` ou `7d dif3`)")
+    finish()
+    return pools
+
+def roll_vampire_pools(specs, scope=None):
+    """Rola várias paradas de uma vez: um único sorteio da sequência fatiado entre elas"""
+    dice, position = dice_rng.draw(scope, sum(spec.dice_count for spec in specs))
+    results = []
+    start = 0
+    for spec in specs:
+        end = start + spec.dice_count
+        # Cada parada ocupa um trecho contíguo da sequência
+        pool_position = (position[0], position[1] + start) if position else None
+        results.append(VampireDiceResult(spec.difficulty, spec.hunger, dice[start:end], spec.title, pool_position))
+        start = end
+    return results
+
+# Motor de números aleatórios auditável
+# stream: sequências determinísticas por servidor (ou canal), reproduzíveis em /verificar
+# csprng: dados direto de os.urandom, imprevisíveis até para quem tem a semente (torneios)
+RNG_MODE = os.getenv('RNG_MODE', 'stream')
+RNG_SCOPE = os.getenv('RNG_SCOPE', 'guild')  # 'guild' ou 'channel'
+RNG_SEED_PATH = os.getenv('RNG_SEED_PATH', 'vamp_rng.seed')
+RNG_SEED_SIZE = 32
+
+def load_rng_seed(path):
+    """Semente mestra (RNG_SEED em hex ou arquivo criado uma única vez); sem ela não há replay"""
+    seed = os.getenv('RNG_SEED')
+    if seed:
+        source = "RNG_SEED"
+        seed = bytes.fromhex(seed)
+    else:
+        source = path
+        try:
+            with open(path, 'rb') as file:
+                seed = file.read()
+        except FileNotFoundError:
+            seed = create_rng_seed(path)
+    # Uma semente curta ou vazia (arquivo truncado) tornaria todas as sequências previsíveis
+    if len(seed) != RNG_SEED_SIZE:
+        raise ValueError(f"{source}: a semente deve ter {RNG_SEED_SIZE} bytes, não {len(seed)}")
+    return seed
+
+def create_rng_seed(path):
+    """Grava a semente num temporário e só então a publica; quem perder a corrida lê a do vencedor"""
+    seed = os.urandom(RNG_SEED_SIZE)
+    descriptor, temporary = tempfile.mkstemp(prefix='.rng-seed-', dir=os.path.dirname(os.path.abspath(path)))
+    try:
+        with os.fdopen(descriptor, 'wb') as file:
+            file.write(seed)
+            file.flush()
+            os.fsync(file.fileno())
+        # Ao contrário do os.replace, o link falha se o arquivo já existe: a semente nunca é trocada
+        os.link(temporary, path)
+    except FileExistsError:
+        with open(path, 'rb') as file:
+            return file.read()
+    finally:
+        os.unlink(temporary)
+    return seed
+
+class DiceStream:
+    """Sequência de dados em blocos: o bloco N é gerado por SHAKE-256(chave || N), como um Philox"""
+
+    BLOCK_DICE = 256
+
+    __slots__ = ('stream_id', 'key', 'position', '_buffer', '_buffer_start')
+
+    def __init__(self, stream_id, key):
+        self.stream_id = stream_id
+        self.key = key
+        self.position = 0  # Índice do próximo dado na sequência
+        self._buffer = b''
+        self._buffer_start = 0
+
+    @classmethod
+    def block(cls, key, index):
+        """Os BLOCK_DICE dados do bloco `index` (função pura: também usada no replay)"""
+        seed = key + index.to_bytes(8, 'little')
+        length = cls.BLOCK_DICE + cls.BLOCK_DICE // 8
+        while True:
+            # Pedir mais bytes ao SHAKE só estende a saída, então o bloco é sempre o mesmo
+            dice = hashlib.shake_256(seed).digest(length).translate(DIE_FACES, DIE_REJECTED)
+            if len(dice) >= cls.BLOCK_DICE:
+                return dice[:cls.BLOCK_DICE]
+            length *= 2
+
+    @classmethod
+    def dice_at(cls, key, position, count):
+        """Dados da posição `position` em diante, gerando só os blocos necessários"""
+        first = position // cls.BLOCK_DICE
+        last = (position + count - 1) // cls.BLOCK_DICE
+        dice = b''.join(cls.block(key, index) for index in range(first, last + 1))
+        offset = position - first * cls.BLOCK_DICE
+        return dice[offset:offset + count]
+
+    def draw(self, count):
+        start = self.position
+        end = start + count
+        buffer_end = self._buffer_start + len(self._buffer)
+        if end > buffer_end:
+            # Reabastece já com o bloco seguinte, para as próximas rolagens saírem do cache
+            first = start // self.BLOCK_DICE
+            last = end // self.BLOCK_DICE + 1
+            self._buffer = b''.join(self.block(self.key, index) for index in range(first, last + 1))
+            self._buffer_start = first * self.BLOCK_DICE
+        offset = start - self._buffer_start
+        self.position = end
+        return self._buffer[offset:offset + count], start
+
+class DiceRNG:
+    """Distribui as sequências de dados por escopo e reproduz rolagens antigas"""
+
+    def __init__(self, mode, seed_path):
+        if mode not in ('stream', 'csprng'):
+            raise ValueError(f"RNG_MODE inválido: {mode}")
+        self.mode = mode
+        self.seed_path = seed_path
+        # No modo stream a semente é carregada já na inicialização: uma semente inválida impede o bot de subir
+        self._seed = load_rng_seed(seed_path) if mode == 'stream' else None
+        # Identifica as sequências deste processo; reiniciar nunca repete dados já usados
+        self._nonce = os.urandom(6).hex()
+        self._streams = {}
+
+    @property
+    def seed(self):
+        if self._seed is None:
+            self._seed = load_rng_seed(self.seed_path)
+        return self._seed
+
+    def stream_key(self, stream_id):
+        return hashlib.blake2b(stream_id.encode(), key=self.seed, digest_size=32).digest()
+
+    def draw(self, scope, count):
+        """Retorna (dados, posição) — posição é (sequência, índice) ou None no modo csprng"""
+        if self.mode == 'csprng':
+            dice = b''
+            while len(dice) < count:
+                missing = count - len(dice)
+                dice += os.urandom(missing + missing // 32 + 8).translate(DIE_FACES, DIE_REJECTED)
+            return dice[:count], None
+
+        scope = scope or 'global'
+        stream = self._streams.get(scope)
+        if stream is None:
+            stream_id = f"{scope}:{self._nonce}"
+            stream = self._streams[scope] = DiceStream(stream_id, self.stream_key(stream_id))
+        dice, position = stream.draw(count)
+        return dice, (stream.stream_id, position)
+
+    def replay(self, stream_id, position, count):
+        """Gera de novo os dados de uma rolagem registrada"""
+        return DiceStream.dice_at(self.stream_key(stream_id), position, count)
+
+dice_rng = DiceRNG(RNG_MODE, RNG_SEED_PATH)
+
+# Trabalho pesado de dados fora do loop de eventos
+DICE_WORKERS = int(os.getenv('DICE_WORKERS', '2'))
+DICE_QUEUE_LIMIT = int(os.getenv('DICE_QUEUE_LIMIT', '8'))  # Tarefas aceitas de uma vez (rodando + esperando)
+DICE_GUILD_LIMIT = int(os.getenv('DICE_GUILD_LIMIT', '2'))  # Tarefas simultâneas por servidor
+INLINE_DICE_LIMIT = 20000  # Até este número de dados o trabalho roda direto no loop
+
+class DiceWorkBusy(Exception):
+    """O bot está sem capacidade para mais trabalho pesado agora"""
+
+class DiceWorkPool:
+    """Pool de processos limitado para trabalho de dados que bloquearia o heartbeat do gateway"""
+
+    def __init__(self, workers, queue_limit, guild_limit):
+        self.workers = workers
+        self.queue_limit = queue_limit
+        self.guild_limit = guild_limit
+        self._executor = None
+        self._in_flight = 0
+        self._per_guild = {}
+
+    def _get_executor(self):
+        if self._executor is None:
+            # spawn: os processos não herdam as threads e conexões do bot; as funções enviadas
+            # vêm do dice_batch, então o trabalho não depende de nada definido no bot.py
+            self._executor = ProcessPoolExecutor(self.workers, mp_context=multiprocessing.get_context('spawn'))
+        return self._executor
+
+    def check(self, guild_id):
+        """Falha na hora, em vez de enfileirar sem limite"""
+        if self._in_flight >= self.queue_limit:
+            raise DiceWorkBusy("⏳ O bot está ocupado com outras simulações, tente novamente em instantes")
+        if self._per_guild.get(guild_id or 0, 0) >= self.guild_limit:
+            raise DiceWorkBusy("⏳ Este servidor já tem simulações em andamento, aguarde terminarem")
+
+    async def run(self, guild_id, dice, func, *args):
+        """Executa func(*args); trabalho leve (até INLINE_DICE_LIMIT dados) roda direto no loop"""
+        if dice <= INLINE_DICE_LIMIT:
+            return func(*args)
+
+        self.check(guild_id)
+        key = guild_id or 0
+        self._in_flight += 1
+        self._per_guild[key] = self._per_guild.get(key, 0) + 1
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self._get_executor(), func, *args)
+        except BrokenProcessPool:
+            # Um processo morreu; o próximo pedido cria um pool novo
+            self._executor = None
+            raise
+        finally:
+            self._in_flight -= 1
+            if self._per_guild[key] == 1:
+                del self._per_guild[key]
+            else:
+                self._per_guild[key] -= 1
+
+    def close(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+dice_pool = DiceWorkPool(DICE_WORKERS, DICE_QUEUE_LIMIT, DICE_GUILD_LIMIT)
+atexit.register(dice_pool.close)
+
+# Probabilidades exatas
+# Cada dado contribui com -1 (1), 0 (2-5), +1 (6-9) ou +2 (10) para o saldo de sucessos.
+# Contagem de faces por contribuição: {saldo: quantidade de faces}
+DIE_CONTRIBUTIONS = {-1: 1, 0: 4, 1: 4, 2: 1}
+
+# Marcadores dos dados de fome (combinados com OR bit a bit)
+HUNGER_ONE = 1  # Algum dado de fome rolou 1
+HUNGER_TEN = 2  # Algum dado de fome rolou 10
+
+DiceOdds = namedtuple('DiceOdds', 'success bestial_failure bestial_success failure expected_successes distribution')
+
+class VampireProbabilityTable:
+    """Tabela pré-calculada com as probabilidades exatas de toda parada válida"""
+
+    def __init__(self, max_dice=20, max_difficulty=10, max_hunger=5):
+        self.max_dice = max_dice
+        self.max_difficulty = max_difficulty
+        self.max_hunger = max_hunger
+        self._odds = [None] * (max_dice * (max_hunger + 1) * max_difficulty)
+
+        for hunger in range(max_hunger + 1):
+            # Distribuição conjunta (saldo, marcadores de fome) -> número de combinações
+            counts = {(0, 0): 1}
+            for _ in range(hunger):
+                counts = self._add_hunger_die(counts)
+
+            for dice_count in range(max(hunger, 1), max_dice + 1):
+                if dice_count > hunger:
+                    counts = self._add_normal_die(counts)
+                self._store(dice_count, hunger, counts)
+
+    @staticmethod
+    def _add_hunger_die(counts):
+        new_counts = {}
+        for (net, flags), ways in counts.items():
+            for contribution, faces in DIE_CONTRIBUTIONS.items():
+                new_flags = flags
+                if contribution == -1:
+                    new_flags |= HUNGER_ONE
+                elif contribution == 2:
+                    new_flags |= HUNGER_TEN
+                key = (net + contribution, new_flags)
+                new_counts[key] = new_counts.get(key, 0) + ways * faces
+        return new_counts
+
+    @staticmethod
+    def _add_normal_die(counts):
+        new_counts = {}
+        for (net, flags), ways in counts.items():
+            for contribution, faces in DIE_CONTRIBUTIONS.items():
+                key = (net + contribution, flags)
+                new_counts[key] = new_counts.get(key, 0) + ways * faces
+        return new_counts
+
+    def _index(self, dice_count, difficulty, hunger):
+        return ((dice_count - 1) * (self.max_hunger + 1) + hunger) * self.max_difficulty + difficulty - 1
+
+    def _store(self, dice_count, hunger, counts):
+        total = 10 ** dice_count
+
+        # Sucessos finais nunca ficam negativos
+        successes = [0] * (2 * dice_count + 1)
+        for (net, _), ways in counts.items():
+            successes[max(0, net)] += ways
+        distribution = tuple(ways / total for ways in successes)
+        expected = sum(value * ways for value, ways in enumerate(successes)) / total
+
+        for difficulty in range(1, self.max_difficulty + 1):
+            success = bestial_failure = bestial_success = failure = 0
+            for (net, flags), ways in counts.items():
+                # Mesma precedência do resultado exibido: falha bestial > sucesso bestial > falha
+                if net >= difficulty:
+                    success += ways
+                elif flags & HUNGER_ONE:
+                    bestial_failure += ways
+                elif flags & HUNGER_TEN:
+                    bestial_success += ways
+                else:
+                    failure += ways
+
+            self._odds[self._index(dice_count, difficulty, hunger)] = DiceOdds(
+                success / total,
+                bestial_failure / total,
+                bestial_success / total,
+                failure / total,
+                expected,
+                distribution,
+            )
+
+    def odds(self, dice_count, difficulty, hunger):
+        """Retorna as probabilidades exatas da parada em O(1)"""
+        if dice_count <= 0 or dice_count > self.max_dice:
+            raise ValueError(f"Número de dados deve estar entre 1 e {self.max_dice}")
+        if difficulty <= 0 or difficulty > self.max_difficulty:
+            raise ValueError(f"Dificuldade deve estar entre 1 e {self.max_difficulty}")
+        if hunger < 0 or hunger > self.max_hunger:
+            raise ValueError(f"Nível de fome deve estar entre 0 e {self.max_hunger}")
+        if hunger > dice_count:
+            raise ValueError("Nível de fome não pode ser maior que o número de dados")
+        return self._odds[self._index(dice_count, difficulty, hunger)]
+
+# Calculada uma única vez na inicialização (20 dados × 10 dificuldades × 6 níveis de fome)
+@lru_cache(maxsize=1)
+def probability_table():
+    """Tabela de probabilidades, montada no primeiro uso para não atrasar a inicialização"""
+    return VampireProbabilityTable()
+
+# Histórico de rolagens
+HISTORY_DB_PATH = os.getenv('HISTORY_DB_PATH', 'vamp_history.sqlite3')
+
+OUTCOME_EMOJIS = {
+    OUTCOME_FAILURE: "❌",
+    OUTCOME_SUCCESS: "✅",
+    OUTCOME_BESTIAL_FAILURE: "🩸",
+    OUTCOME_BESTIAL_SUCCESS: "🔥",
+}
+
+# Exportação do histórico em .npz (um .npy por coluna, legível com numpy.load)
+EXPORT_CHUNK_ROWS = 20000
+EXPORT_DICE_WIDTH = 20
+# Colunas por linha: (nome, tipo NumPy, código do array)
+EXPORT_COLUMNS = (
+    ('id', '<i8', 'q'),
+    ('created_at', '<f8', 'd'),
+    ('channel_id', '<u8', 'Q'),
+    ('user_id', '<u8', 'Q'),
+    ('dice_count', '|u1', 'B'),
+    ('difficulty', '|u1', 'B'),
+    ('hunger', '|u1', 'B'),
+    ('successes', '|u1', 'B'),
+    ('outcome', '|u1', 'B'),
+    ('critical', '|b1', 'B'),
+    ('messy_critical', '|b1', 'B'),
+)
+
+def npy_header(descr, shape):
+    """Cabeçalho .npy versão 1.0, com o preenchimento até múltiplo de 64 bytes que o NumPy usa"""
+    header = f"{{'descr': '{descr}', 'fortran_order': False, 'shape': {shape!r}, }}"
+    # 10 bytes fixos (assinatura, versão e tamanho) + cabeçalho + '\n'
+    header += ' ' * (-(10 + len(header) + 1) % 64) + '\n'
+    return b'\x93NUMPY\x01\x00' + len(header).to_bytes(2, 'little') + header.encode('latin1')
+
+class SQLiteDatabase:
+    """Uma conexão e uma thread para todos os armazenamentos do mesmo arquivo SQLite
+
+    Com uma thread só, gravações e consultas do histórico, das estatísticas e das fichas ficam
+    em ordem e não disputam entre si o lock de escrita do arquivo.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._stores = []
+        self._connection = None
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='banco')
+
+    def register(self, store):
+        self._stores.append(store)
+
+    def connect(self):
+        """Conexão da thread do banco; na primeira vez cria as tabelas de todos os armazenamentos"""
+        if self._connection is None:
+            connection = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            for store in self._stores:
+                store.create_schema(connection)
+            connection.commit()
+            self._connection = connection
+        return self._connection
+
+    async def run(self, func, *args):
+        return await asyncio.get_running_loop().run_in_executor(self._executor, func, *args)
+
+    def close(self):
+        """Grava o que ficou pendente em cada armazenamento (chamado ao encerrar o processo)"""
+        self._executor.shutdown(wait=True)
+        for store in self._stores:
+            rows = store._take_dirty()
+            if rows:
+                store._write(rows)
+        if self._connection is not None:
+            self._connection.close()
+            self._connection = None
+
+class WriteBehindStore:
+    """Base dos armazenamentos gravados depois (write-behind) em segundo plano num SQLiteDatabase
+
+    Subclasses definem SCHEMA, LABEL, _take_dirty (o que mudou desde a última gravação, já em
+    linhas) e _write; _load lê o que for preciso na inicialização.
+    """
+
+    SCHEMA = ()
+    LABEL = "dados"
+
+    def __init__(self, database, flush_interval):
+        self.database = database
+        self.flush_interval = flush_interval
+        self._wakeup = None
+        self._flush_task = None
+        database.register(self)
+
+    def create_schema(self, connection):
+        for statement in self.SCHEMA:
+            connection.execute(statement)
+
+    def _connect(self):
+        return self.database.connect()
+
+    async def _run(self, func, *args):
+        return await self.database.run(func, *args)
+
+    def _load(self):
+        pass
+
+    def _take_dirty(self):
+        raise NotImplementedError
+
+    def _write(self, rows):
+        raise NotImplementedError
+
+    def wake(self):
+        """Antecipa a próxima gravação"""
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    async def flush(self):
+        rows = self._take_dirty()
+        if rows:
+            await self._run(self._write, rows)
+
+    async def _flush_loop(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            try:
+                await self.flush()
+            except sqlite3.Error as e:
+                print(f"Falha ao salvar {self.LABEL}: {e}")
+
+    async def start(self):
+        if self._flush_task is None:
+            await self._run(self._load)
+            self._wakeup = asyncio.Event()
+            self._flush_task = asyncio.get_running_loop().create_task(self._flush_loop())
+
+class RollHistory(WriteBehindStore):
+    """Histórico de rolagens em SQLite, só de inserção, gravado em lotes em segundo plano"""
+
+    PAGE_SIZE = 10
+    LABEL = "histórico"
+
+    SCHEMA = (
+        """CREATE TABLE IF NOT EXISTS rolls (
+            id INTEGER PRIMARY KEY,
+            created_at REAL NOT NULL,
+            guild_id INTEGER,
+            channel_id INTEGER,
+            user_id INTEGER NOT NULL,
+            dice_count INTEGER NOT NULL,
+            difficulty INTEGER NOT NULL,
+            hunger INTEGER NOT NULL,
+            title TEXT,
+            dice BLOB NOT NULL,
+            successes INTEGER NOT NULL,
+            outcome INTEGER NOT NULL,
+            rng_stream TEXT,
+            rng_position INTEGER
+        )""",
+        "CREATE INDEX IF NOT EXISTS rolls_guild ON rolls (guild_id, created_at)",
+        "CREATE INDEX IF NOT EXISTS rolls_channel ON rolls (channel_id, created_at)",
+        "CREATE INDEX IF NOT EXISTS rolls_user ON rolls (user_id, created_at)",
+        "CREATE INDEX IF NOT EXISTS rolls_time ON rolls (created_at)",
+    )
+
+    # Colunas acrescentadas depois da primeira versão: (nome, tipo)
+    MIGRATIONS = (
+        ('rng_stream', 'TEXT'),
+        ('rng_position', 'INTEGER'),
+        # Força de Vontade: índices dos dados rerrolados (a sequência e a posição são as do reroll)
+        ('reroll_positions', 'BLOB'),
+    )
+
+    def __init__(self, database, flush_interval=2.0, max_batch=500):
+        super().__init__(database, flush_interval)
+        self.max_batch = max_batch
+        self._pending = []
+
+    def create_schema(self, connection):
+        super().create_schema(connection)
+        columns = {row[1] for row in connection.execute("PRAGMA table_info(rolls)")}
+        for name, kind in self.MIGRATIONS:
+            if name not in columns:
+                connection.execute(f"ALTER TABLE rolls ADD COLUMN {name} {kind}")
+
+    def record(self, guild_id, channel_id, user_id, result, rerolled=None):
+        """Enfileira uma rolagem; nunca toca o disco no caminho da resposta
+
+        `rerolled` são os índices trocados pela Força de Vontade: a linha guarda a rolagem final e
+        `result.rng_position` aponta para os dados novos.
+        """
+        stream_id, position = result.rng_position or (None, None)
+        self._pending.append((
+            time.time(), guild_id, channel_id, user_id,
+            result.dice_count, result.difficulty, result.hunger, result.title,
+            result.results, result.successes, result.outcome, stream_id, position,
+            bytes(rerolled) if rerolled is not None else None,
+        ))
+        if len(self._pending) >= self.max_batch:
+            self.wake()
+
+    def _write(self, rows):
+        connection = self._connect()
+        with connection:
+            connection.executemany(
+                "INSERT INTO rolls (created_at, guild_id, channel_id, user_id, dice_count, difficulty, "
+                "hunger, title, dice, successes, outcome, rng_stream, rng_position, reroll_positions) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                rows,
+            )
+
+    def _take_dirty(self):
+        rows, self._pending = self._pending, []
+        return rows
+
+    def _query_page(self, guild_id, channel_id, user_id, page):
+        conditions = []
+        params = []
+        if guild_id is not None:
+            conditions.append("guild_id = ?")
+            params.append(guild_id)
+        if channel_id is not None:
+            conditions.append("channel_id = ?")
+            params.append(channel_id)
+        if user_id is not None:
+            conditions.append("user_id = ?")
+            params.append(user_id)
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+
+        # Uma linha a mais indica se existe próxima página
+        params.extend((self.PAGE_SIZE + 1, page * self.PAGE_SIZE))
+        rows = self._connect().execute(
+            "SELECT id, created_at, user_id, dice_count, difficulty, hunger, title, dice, successes, outcome, "
+            f"reroll_positions FROM rolls {where} ORDER BY created_at DESC, id DESC LIMIT ? OFFSET ?",
+            params,
+        ).fetchall()
+        return rows[:self.PAGE_SIZE], len(rows) > self.PAGE_SIZE
+
+    async def page(self, guild_id=None, channel_id=None, user_id=None, page=0):
+        """Retorna (linhas, tem_proxima) de uma página do histórico, mais recentes primeiro"""
+        await self.flush()
+        return await self._run(self._query_page, guild_id, channel_id, user_id, page)
+
+    def _query_roll(self, roll_id):
+        return self._connect().execute(
+            "SELECT id, created_at, guild_id, user_id, dice_count, difficulty, hunger, title, dice, "
+            "rng_stream, rng_position, reroll_positions FROM rolls WHERE id = ?",
+            (roll_id,),
+        ).fetchone()
+
+    async def get(self, roll_id):
+        """Uma rolagem pelo número mostrado no /historico (ou None)"""
+        await self.flush()
+        return await self._run(self._query_roll, roll_id)
+
+    def _export(self, path, guild_id, user_id, since):
+        # Sem as linhas de Força de Vontade: os dados mantidos já estão na rolagem original e
+        # contá-los de novo (são os sucessos) distorceria a frequência das faces
+        conditions = ["guild_id IS ?", "reroll_positions IS NULL"]
+        params = [guild_id]
+        if user_id is not None:
+            conditions.append("user_id = ?")
+            params.append(user_id)
+        if since is not None:
+            conditions.append("created_at >= ?")
+            params.append(since)
+
+        # Conexão própria: no WAL a leitura longa não bloqueia as gravações da thread do histórico
+        connection = sqlite3.connect(self.database.path, timeout=30)
+        spools = {name: tempfile.TemporaryFile() for name, _, _ in EXPORT_COLUMNS}
+        spools['dice'] = tempfile.TemporaryFile()
+        total = 0
+        try:
+            cursor = connection.execute(
+                "SELECT id, created_at, channel_id, user_id, dice_count, difficulty, hunger, successes, "
+                f"outcome, dice FROM rolls WHERE {' AND '.join(conditions)} ORDER BY id",
+                params,
+            )
+            # Um bloco por vez: cada coluna vai para o seu arquivo temporário
+            while True:
+                rows = cursor.fetchmany(EXPORT_CHUNK_ROWS)
+                if not rows:
+                    break
+                total += len(rows)
+                columns = [list(column) for column in zip(*rows)]
+                dice = columns.pop()
+                results = [VampireDiceResult(row[5], row[6], row[9]) for row in rows]
+                columns.append([result.critical_win for result in results])
+                columns.append([result.messy_critical for result in results])
+                for (name, _, typecode), values in zip(EXPORT_COLUMNS, columns):
+                    # Colunas sem canal (rolagens antigas) ficam como 0
+                    chunk = array(typecode, [value or 0 for value in values])
+                    if sys.byteorder == 'big':
+                        chunk.byteswap()
+                    spools[name].write(chunk.tobytes())
+                spools['dice'].write(b''.join(bytes(faces).ljust(EXPORT_DICE_WIDTH, b'\0') for faces in dice))
+
+            with zipfile.ZipFile(path, 'w', zipfile.ZIP_DEFLATED) as archive:
+                layout = [(name, descr, (total,)) for name, descr, _ in EXPORT_COLUMNS]
+                layout.append(('dice', '|u1', (total, EXPORT_DICE_WIDTH)))
+                for name, descr, shape in layout:
+                    spool = spools[name]
+                    spool.seek(0)
+                    with archive.open(f'{name}.npy', 'w', force_zip64=True) as entry:
+                        entry.write(npy_header(descr, shape))
+                        shutil.copyfileobj(spool, entry, 1 << 20)
+        finally:
+            for spool in spools.values():
+                spool.close()
+            connection.close()
+        return total
+
+    async def export(self, path, guild_id, user_id=None, since=None):
+        """Grava as rolagens do servidor em um .npz colunar, em blocos; retorna quantas foram exportadas
+
+        Os dados de cada rolagem ficam em uma matriz (rolagens x 20), completada com 0; os
+        primeiros `hunger` dados de cada linha são os de fome.
+        """
+        await self.flush()
+        # Garante a tabela (e as migrações) antes da leitura em outra conexão
+        await self._run(self._connect)
+        return await asyncio.to_thread(self._export, path, guild_id, user_id, since)
+
+# Histórico, estatísticas e fichas dividem o arquivo, a conexão e a thread
+database = SQLiteDatabase(HISTORY_DB_PATH)
+atexit.register(database.close)
+
+roll_history = RollHistory(database)
+
+# Estatísticas por jogador
+# Posições dos contadores no array de cada jogador
+(
+    STAT_ROLLS, STAT_SUCCESSES, STAT_BESTIAL_FAILURES, STAT_BESTIAL_SUCCESSES,
+    STAT_DICE, STAT_NET_SUCCESSES, STAT_EXPECTED_SUCCESSES, STAT_LUCKY_ROLLS,
+) = range(8)
+STAT_FIELDS = 8
+
+PlayerSummary = namedtuple(
+    'PlayerSummary',
+    'rolls success_rate bestial_failures bestial_successes successes_per_die expected_per_die luck_rate luck_balance',
+)
+
+class PlayerStats(WriteBehindStore):
+    """Totais de cada jogador, atualizados a cada rolagem e salvos periodicamente"""
+
+    LABEL = "estatísticas"
+    SCHEMA = ("""CREATE TABLE IF NOT EXISTS player_stats (
+        guild_id INTEGER NOT NULL,
+        user_id INTEGER NOT NULL,
+        rolls REAL NOT NULL,
+        successes REAL NOT NULL,
+        bestial_failures REAL NOT NULL,
+        bestial_successes REAL NOT NULL,
+        dice REAL NOT NULL,
+        net_successes REAL NOT NULL,
+        expected_successes REAL NOT NULL,
+        lucky_rolls REAL NOT NULL,
+        PRIMARY KEY (guild_id, user_id)
+    )""",)
+
+    def __init__(self, database, checkpoint_interval=60.0):
+        super().__init__(database, checkpoint_interval)
+        # (guild_id, user_id) -> array('d') com STAT_FIELDS contadores
+        self._counters = {}
+        self._dirty = set()
+
+    def record(self, guild_id, user_id, result):
+        """Soma uma rolagem aos totais do jogador em O(1)"""
+        key = (guild_id or 0, user_id)
+        counters = self._counters.get(key)
+        if counters is None:
+            counters = self._counters[key] = array('d', bytes(8 * STAT_FIELDS))
+
+        # O valor esperado só depende de dados e fome
+        expected = probability_table().odds(result.dice_count, 1, result.hunger).expected_successes
+        outcome = result.outcome
+
+        counters[STAT_ROLLS] += 1
+        counters[STAT_SUCCESSES] += outcome == OUTCOME_SUCCESS
+        counters[STAT_BESTIAL_FAILURES] += outcome == OUTCOME_BESTIAL_FAILURE
+        counters[STAT_BESTIAL_SUCCESSES] += outcome == OUTCOME_BESTIAL_SUCCESS
+        counters[STAT_DICE] += result.dice_count
+        counters[STAT_NET_SUCCESSES] += result.successes
+        counters[STAT_EXPECTED_SUCCESSES] += expected
+        counters[STAT_LUCKY_ROLLS] += result.successes > expected
+        self._dirty.add(key)
+
+    def reroll(self, guild_id, user_id, original, result):
+        """Força de Vontade: troca nos totais o resultado original pelo final (a rolagem conta uma vez só)"""
+        key = (guild_id or 0, user_id)
+        counters = self._counters.get(key)
+        if counters is None:
+            # A rolagem original não foi contada neste processo: conta a final como rolagem nova
+            self.record(guild_id, user_id, result)
+            return
+
+        expected = probability_table().odds(result.dice_count, 1, result.hunger).expected_successes
+        for outcome_result, sign in ((original, -1), (result, 1)):
+            outcome = outcome_result.outcome
+            counters[STAT_SUCCESSES] += sign * (outcome == OUTCOME_SUCCESS)
+            counters[STAT_BESTIAL_FAILURES] += sign * (outcome == OUTCOME_BESTIAL_FAILURE)
+            counters[STAT_BESTIAL_SUCCESSES] += sign * (outcome == OUTCOME_BESTIAL_SUCCESS)
+            counters[STAT_NET_SUCCESSES] += sign * outcome_result.successes
+            counters[STAT_LUCKY_ROLLS] += sign * (outcome_result.successes > expected)
+        self._dirty.add(key)
+
+    def summary(self, guild_id, user_id):
+        """Resumo dos totais do jogador, ou None se ele nunca rolou"""
+        counters = self._counters.get((guild_id or 0, user_id))
+        if counters is None:
+            return None
+        rolls = counters[STAT_ROLLS]
+        return PlayerSummary(
+            int(rolls),
+            counters[STAT_SUCCESSES] / rolls,
+            int(counters[STAT_BESTIAL_FAILURES]),
+            int(counters[STAT_BESTIAL_SUCCESSES]),
+            counters[STAT_NET_SUCCESSES] / counters[STAT_DICE],
+            counters[STAT_EXPECTED_SUCCESSES] / counters[STAT_DICE],
+            counters[STAT_LUCKY_ROLLS] / rolls,
+            counters[STAT_NET_SUCCESSES] - counters[STAT_EXPECTED_SUCCESSES],
+        )
+
+    def _load(self):
+        rows = self._connect().execute("SELECT * FROM player_stats").fetchall()
+        for guild_id, user_id, *values in rows:
+            # Com vários processos, cada um só carrega (e depois grava) os servidores dos seus shards
+            if owns_guild(guild_id):
+                self._counters[(guild_id, user_id)] = array('d', values)
+
+    def _write(self, rows):
+        connection = self._connect()
+        with connection:
+            connection.executemany(
+                f"INSERT OR REPLACE INTO player_stats VALUES ({', '.join('?' * (STAT_FIELDS + 2))})",
+                rows,
+            )
+
+    def _take_dirty(self):
+        dirty, self._dirty = self._dirty, set()
+        return [(*key, *self._counters[key]) for key in dirty]
+
+player_stats = PlayerStats(database)
+
+# Fichas de personagem
+SHEET_CACHE_SIZE = int(os.getenv('SHEET_CACHE_SIZE', '5000'))
+SHEET_TRAIT_LIMIT = 64
+
+# Nomes canônicos (V5 em português); traços fora destas listas são tratados como disciplinas
+ATTRIBUTE_NAMES = (
+    'Força', 'Destreza', 'Vigor', 'Carisma', 'Manipulação', 'Autocontrole',
+    'Inteligência', 'Raciocínio', 'Determinação',
+)
+SKILL_NAMES = (
+    'Armas Brancas', 'Armas de Fogo', 'Atletismo', 'Briga', 'Condução', 'Furtividade', 'Ladroagem',
+    'Ofícios', 'Sobrevivência', 'Empatia com Animais', 'Etiqueta', 'Intimidação', 'Intuição',
+    'Liderança', 'Manha', 'Performance', 'Persuasão', 'Subterfúgio', 'Ciência', 'Consciência',
+    'Erudição', 'Finanças', 'Investigação', 'Medicina', 'Ocultismo', 'Política', 'Tecnologia',
+)
+
+def trait_key(name):
+    """Nome de traço sem acentos, maiúsculas ou espaços extras ("manipulacao" == "Manipulação")"""
+    name = unicodedata.normalize('NFKD', name).encode('ascii', 'ignore').decode()
+    return " ".join(name.lower().split())
+
+ATTRIBUTE_KEYS = {trait_key(name): name for name in ATTRIBUTE_NAMES}
+SKILL_KEYS = {trait_key(name): name for name in SKILL_NAMES}
+
+SHEET_TRAIT = re.compile(r'\s*([^\d,;:=]+?)\s*[:=]?\s*(\d+)\s*(?:[,;]|$)')
+POOL_TERM = re.compile(r'\s*([+-])?\s*(\d+|[^\d+-]+?)\s*(?=[+-]|$)')
+
+class CharacterSheet:
+    """Ficha de um personagem: traços (chave normalizada -> (nome, valor)) e fome atual"""
+
+    __slots__ = ('name', 'hunger', 'traits')
+
+    def __init__(self, name=None, hunger=0, traits=None):
+        self.name = name
+        self.hunger = hunger
+        self.traits = traits if traits is not None else {}
+
+    def set_traits(self, text):
+        """Aplica "Força 2, Destreza 3, Briga 1"; valor 0 remove o traço"""
+        matches = list(SHEET_TRAIT.finditer(text))
+        if not matches or sum(len(match[0]) for match in matches) != len(text):
+            raise ValueError("Use o formato `Força 2, Destreza 3, Briga 1`")
+        # Valida tudo antes de mudar a ficha (que pode ser a do cache)
+        traits = dict(self.traits)
+        for match in matches:
+            label, value = match[1].strip(), int(match[2])
+            if value > 5:
+                raise ValueError(f"{label}: o valor deve estar entre 0 e 5")
+            key = trait_key(label)
+            if value == 0:
+                traits.pop(key, None)
+            else:
+                traits[key] = (ATTRIBUTE_KEYS.get(key) or SKILL_KEYS.get(key) or label, value)
+        if len(traits) > SHEET_TRAIT_LIMIT:
+            raise ValueError(f"A ficha aceita no máximo {SHEET_TRAIT_LIMIT} traços")
+        self.traits = traits
+
+    def resolve_pool(self, expression):
+        """Parada de uma expressão como "Destreza+Briga" ou "Raciocínio + Ocultismo - 1": (dados, nome)"""
+        matches = list(POOL_TERM.finditer(expression))
+        if not matches or sum(len(match[0]) for match in matches) != len(expression):
+            raise ValueError("Use o formato `Destreza+Briga` (pode somar ou subtrair números)")
+        dice_count = 0
+        labels = []
+        for match in matches:
+            sign = -1 if match[1] == '-' else 1
+            term = match[2].strip()
+            if term.isdigit():
+                dice_count += sign * int(term)
+                labels.append(f"{match[1] or '+'} {term}")
+                continue
+            trait = self.traits.get(trait_key(term))
+            if trait is None:
+                raise ValueError(f"Traço não encontrado na ficha: {term}")
+            dice_count += sign * trait[1]
+            labels.append(f"{match[1] or '+'} {trait[0]}")
+        return dice_count, " ".join(labels).removeprefix("+ ")
+
+    def to_row(self):
+        return self.name, self.hunger, json.dumps([list(trait) for trait in self.traits.values()], ensure_ascii=False)
+
+    @classmethod
+    def from_row(cls, name, hunger, traits):
+        return cls(name, hunger, {trait_key(label): (label, value) for label, value in json.loads(traits)})
+
+class CharacterSheets(WriteBehindStore):
+    """Fichas em SQLite com um cache LRU na frente; alterações são gravadas depois (write-back)"""
+
+    LABEL = "fichas"
+    SCHEMA = ("""CREATE TABLE IF NOT EXISTS character_sheets (
+        guild_id INTEGER NOT NULL,
+        user_id INTEGER NOT NULL,
+        name TEXT,
+        hunger INTEGER NOT NULL,
+        traits TEXT NOT NULL,
+        PRIMARY KEY (guild_id, user_id)
+    )""",)
+
+    def __init__(self, database, capacity, checkpoint_interval=30.0):
+        super().__init__(database, checkpoint_interval)
+        self.capacity = capacity
+        # (guild_id, user_id) -> CharacterSheet, do menos para o mais usado
+        self._cache = OrderedDict()
+        # Chaves com ficha gravada: quem não tem ficha nunca causa leitura do disco
+        self._known = set()
+        self._dirty = set()
+        # Fichas alteradas que saíram do cache antes de serem gravadas
+        self._evicted = {}
+
+    def _remember(self, key, sheet):
+        cache = self._cache
+        cache[key] = sheet
+        cache.move_to_end(key)
+        while len(cache) > self.capacity:
+            old_key, old_sheet = cache.popitem(last=False)
+            if old_key in self._dirty:
+                self._evicted[old_key] = old_sheet
+
+    async def get(self, guild_id, user_id):
+        """Ficha do jogador (ou None); só vai ao disco na primeira leitura de uma ficha existente"""
+        key = (guild_id or 0, user_id)
+        sheet = self._cache.get(key)
+        if sheet is not None:
+            self._cache.move_to_end(key)
+            return sheet
+        sheet = self._evicted.pop(key, None)
+        if sheet is None:
+            if key not in self._known:
+                return None
+            row = await self._run(self._read, key)
+            # Outra tarefa pode ter carregado ou criado a ficha durante a leitura
+            sheet = self._cache.get(key) or self._evicted.pop(key, None)
+            if sheet is None:
+                if row is None:
+                    return None
+                sheet = CharacterSheet.from_row(*row)
+        self._remember(key, sheet)
+        return sheet
+
+    async def get_or_create(self, guild_id, user_id):
+        sheet = await self.get(guild_id, user_id)
+        if sheet is None:
+            sheet = CharacterSheet()
+            self.save(guild_id, user_id, sheet)
+        return sheet
+
+    def save(self, guild_id, user_id, sheet):
+        """Marca a ficha como alterada; a gravação acontece no próximo checkpoint"""
+        key = (guild_id or 0, user_id)
+        self._known.add(key)
+        self._dirty.add(key)
+        self._remember(key, sheet)
+
+    def _read(self, key):
+        return self._connect().execute(
+            "SELECT name, hunger, traits FROM character_sheets WHERE guild_id = ? AND user_id = ?", key
+        ).fetchone()
+
+    def _load(self):
+        rows = self._connect().execute("SELECT guild_id, user_id FROM character_sheets").fetchall()
+        # Como nas estatísticas, cada processo só cuida dos servidores dos seus shards
+        self._known.update(key for key in rows if owns_guild(key[0]))
+
+    def _write(self, rows):
+        connection = self._connect()
+        with connection:
+            connection.executemany("INSERT OR REPLACE INTO character_sheets VALUES (?, ?, ?, ?, ?)", rows)
+
+    def _take_dirty(self):
+        dirty, self._dirty = self._dirty, set()
+        rows = []
+        for key in dirty:
+            sheet = self._cache.get(key) or self._evicted[key]
+            rows.append((*key, *sheet.to_row()))
+        self._evicted.clear()
+        return rows
+
+character_sheets = CharacterSheets(database, SHEET_CACHE_SIZE)
+
+# Métricas de latência
+METRICS_PATH = os.getenv('METRICS_PATH', 'vamp_metrics.prom')
+METRICS_INTERVAL = float(os.getenv('METRICS_INTERVAL', '30'))
+
+class LatencyHistogram:
+    """Histograma log-linear estilo HDR em microssegundos (erro relativo de até 1/16)"""
+
+    SUB_BUCKETS = 32  # Valores abaixo disso têm balde exato
+    HALF = 16
+    BUCKETS = SUB_BUCKETS + 32 * HALF
+
+    __slots__ = ('counts', 'count', 'total', 'max')
+
+    def __init__(self):
+        self.counts = array('Q', bytes(8 * self.BUCKETS))
+        self.count = 0
+        self.total = 0
+        self.max = 0
+
+    @classmethod
+    def _index(cls, value):
+        if value < cls.SUB_BUCKETS:
+            return value
+        shift = value.bit_length() - 5
+        index = cls.SUB_BUCKETS + (shift - 1) * cls.HALF + (value >> shift) - cls.HALF
+        return min(index, cls.BUCKETS - 1)
+
+    @classmethod
+    def _value(cls, index):
+        """Valor representativo (meio do balde) de um índice"""
+        if index < cls.SUB_BUCKETS:
+            return index
+        shift = (index - cls.SUB_BUCKETS) // cls.HALF + 1
+        top = (index - cls.SUB_BUCKETS) % cls.HALF + cls.HALF
+        return (top << shift) + (1 << (shift - 1))
+
+    def record(self, microseconds):
+        self.counts[self._index(microseconds)] += 1
+        self.count += 1
+        self.total += microseconds
+        if microseconds > self.max:
+            self.max = microseconds
+
+    def percentile(self, quantile):
+        """Percentil em microssegundos (0 se vazio)"""
+        if self.count == 0:
+            return 0
+        target = max(1, round(quantile * self.count))
+        seen = 0
+        for index, count in enumerate(self.counts):
+            seen += count
+            if seen >= target:
+                return min(self._value(index), self.max)
+        return self.max
+
+class LatencyTrace:
+    """Marca as etapas de um comando; cada mark registra o tempo desde a marca anterior"""
+
+    __slots__ = ('metrics', 'command', 'start', 'last')
+
+    def __init__(self, metrics, command):
+        self.metrics = metrics
+        self.command = command
+        self.start = self.last = time.perf_counter_ns()
+
+    def mark(self, phase):
+        now = time.perf_counter_ns()
+        self.metrics.record(self.command, phase, (now - self.last) // 1000)
+        self.last = now
+
+    def finish(self):
+        self.metrics.record(self.command, 'total', (time.perf_counter_ns() - self.start) // 1000)
+
+class LatencyMetrics:
+    """Histogramas de latência por (comando, etapa)"""
+
+    QUANTILES = (0.5, 0.95, 0.99)
+
+    def __init__(self):
+        self._histograms = {}
+        # Outras métricas exportadas no mesmo arquivo (funções que retornam texto do Prometheus)
+        self._sources = []
+        self._export_task = None
+
+    def add_source(self, source):
+        self._sources.append(source)
+
+    def trace(self, command):
+        return LatencyTrace(self, command)
+
+    def record(self, command, phase, microseconds):
+        histogram = self._histograms.get((command, phase))
+        if histogram is None:
+            histogram = self._histograms[(command, phase)] = LatencyHistogram()
+        histogram.record(microseconds)
+
+    def histograms(self):
+        return sorted(self._histograms.items())
+
+    def prometheus_text(self):
+        """Métricas no formato de texto do Prometheus (tipo summary, em segundos)"""
+        name = "vamp_interaction_latency_seconds"
+        lines = [
+            f"# HELP {name} Tempo entre receber a interação e responder, por comando e etapa",
+            f"# TYPE {name} summary",
+        ]
+        for (command, phase), histogram in self.histograms():
+            labels = f'command="{command}",phase="{phase}"'
+            for quantile in self.QUANTILES:
+                lines.append(f'{name}{{{labels},quantile="{quantile}"}} {histogram.percentile(quantile) / 1e6:.6f}')
+            lines.append(f"{name}_sum{{{labels}}} {histogram.total / 1e6:.6f}")
+            lines.append(f"{name}_count{{{labels}}} {histogram.count}")
+        return "\n".join(lines) + "\n" + "".join(source() for source in self._sources)
+
+    async def _export_loop(self, path, interval):
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                await asyncio.to_thread(write_text_atomic, path, self.prometheus_text())
+            except OSError as e:
+                print(f"Falha ao exportar métricas: {e}")
+
+    def start(self, path, interval):
+        if self._export_task is None:
+            self._export_task = asyncio.get_running_loop().create_task(self._export_loop(path, interval))
+
+def write_text_atomic(path, text):
+    """Grava um arquivo por completo ou não grava (leitores nunca veem arquivo pela metade)"""
+    temporary = f"{path}.tmp"
+    with open(temporary, 'w', encoding='utf-8') as file:
+        file.write(text)
+    os.replace(temporary, path)
+
+latency_metrics = LatencyMetrics()
+
+# Fila de envio
+# Toda resposta passa por aqui: faixas de prioridade (respostas de interação antes de follow-ups
+# e de respostas a comandos de texto) e baldes de fichas por canal e global, para que um canal
+# movimentado espere sua vez sem atrasar os outros nem depender dos 429 do Discord
+LANE_INTERACTION, LANE_FOLLOWUP, LANE_PREFIX = range(3)
+LANE_NAMES = ('interacao', 'followup', 'texto')
+
+# Limites do Discord para mensagens em canais: 50 requisições/s globais e 5 mensagens a cada 5 s
+# por canal (com folga); respostas de interação ficam de fora dos dois
+OUTBOUND_GLOBAL_RATE = float(os.getenv('OUTBOUND_GLOBAL_RATE', '45'))
+OUTBOUND_CHANNEL_RATE = float(os.getenv('OUTBOUND_CHANNEL_RATE', '1'))
+OUTBOUND_CHANNEL_BURST = int(os.getenv('OUTBOUND_CHANNEL_BURST', '5'))
+# Requisições em andamento ao mesmo tempo; com a fila cheia, as faixas definem quem vai primeiro
+OUTBOUND_CONCURRENCY = int(os.getenv('OUTBOUND_CONCURRENCY', '50'))
+MAX_EMBEDS_PER_MESSAGE = 10
+
+class TokenBucket:
+    """Balde de fichas: `rate` fichas por segundo, acumulando até `capacity`"""
+
+    __slots__ = ('rate', 'capacity', 'tokens', 'updated')
+
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+
+    def delay(self, now):
+        """Segundos até haver uma ficha (0 se já há)"""
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        return 0.0 if self.tokens >= 1 else (1 - self.tokens) / self.rate
+
+    def take(self):
+        self.tokens -= 1
+
+class OutboundMessage:
+    __slots__ = ('send', 'kwargs', 'future', 'queued_at')
+
+    def __init__(self, send, kwargs, future):
+        self.send = send
+        self.kwargs = kwargs
+        self.future = future
+        self.queued_at = time.perf_counter()
+
+    @property
+    def mergeable(self):
+        """Só embeds, sem texto, botões ou arquivos: pode ir junto com outras respostas do canal"""
+        return self.kwargs.keys() <= {'embed', 'embeds'}
+
+    def embeds(self):
+        if 'embed' in self.kwargs:
+            return [self.kwargs['embed']]
+        return list(self.kwargs.get('embeds', ()))
+
+class OutboundQueue:
+    """Fila de envio com prioridades, limites de taxa e junção de respostas de texto por canal"""
+
+    def __init__(self, global_rate, channel_rate, channel_burst, concurrency):
+        self.channel_rate = channel_rate
+        self.channel_burst = channel_burst
+        self.concurrency = concurrency
+        self.global_bucket = TokenBucket(global_rate, global_rate)
+        self._channel_buckets = {}
+        # Por faixa: chave (canal nas respostas de texto, None nas outras) -> fila de mensagens
+        self._lanes = tuple(OrderedDict() for _ in LANE_NAMES)
+        self._depth = [0] * len(LANE_NAMES)
+        self._sent = [0] * len(LANE_NAMES)
+        self._merged = 0
+        self.in_flight = 0
+        self._loop = None
+        self._wakeup = None
+        self._slots = None
+        self._task = None
+        self._deliveries = set()
+
+    def _ensure_worker(self):
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            self._loop = loop
+            self._wakeup = asyncio.Event()
+            self._slots = asyncio.Semaphore(self.concurrency)
+            self._task = loop.create_task(self._worker())
+
+    def _enqueue(self, lane, key, send, kwargs):
+        self._ensure_worker()
+        future = self._loop.create_future()
+        queue = self._lanes[lane].get(key)
+        if queue is None:
+            queue = self._lanes[lane][key] = deque()
+        queue.append(OutboundMessage(send, kwargs, future))
+        self._depth[lane] += 1
+        self._wakeup.set()
+        return future
+
+    @staticmethod
+    def _message(content, kwargs):
+        if content is not None:
+            kwargs['content'] = content
+        # view=None é "sem botões": o discord.py não aceita None ao enviar, e sem botões
+        # uma resposta de texto pode ser juntada com outras
+        if 'view' in kwargs and kwargs['view'] is None:
+            del kwargs['view']
+        return kwargs
+
+    async def respond(self, interaction, content=None, **kwargs):
+        """Resposta inicial a uma interação (prioridade máxima; sem limite por canal nem global)"""
+        return await self._enqueue(LANE_INTERACTION, None, interaction.response.send_message, self._message(content, kwargs))
+
+    async def defer(self, interaction, **kwargs):
+        """Confirma a interação para responder depois por follow-up (mesma faixa das respostas)"""
+        return await self._enqueue(LANE_INTERACTION, None, interaction.response.defer, kwargs)
+
+    async def followup(self, interaction, content=None, **kwargs):
+        return await self._enqueue(LANE_FOLLOWUP, None, interaction.followup.send, self._message(content, kwargs))
+
+    async def edit_original(self, interaction, **kwargs):
+        return await self._enqueue(LANE_FOLLOWUP, None, interaction.edit_original_response, kwargs)
+
+    async def send(self, ctx, content=None, **kwargs):
+        """Resposta a um comando de texto; respostas só de embeds no mesmo canal podem ser juntadas"""
+        return await self._enqueue(LANE_PREFIX, ctx.channel.id, ctx.send, self._message(content, kwargs))
+
+    def _channel_bucket(self, channel_id):
+        bucket = self._channel_buckets.get(channel_id)
+        if bucket is None:
+            bucket = self._channel_buckets[channel_id] = TokenBucket(self.channel_rate, self.channel_burst)
+        return bucket
+
+    def _next_batch(self, now):
+        """Próximas mensagens a enviar (uma, ou várias juntadas) e, se nenhuma, quanto esperar"""
+        wait = None
+        for lane, queues in enumerate(self._lanes):
+            if not queues:
+                continue
+            # Endpoints de interação (resposta, follow-up, edição) não contam no limite global
+            if lane == LANE_PREFIX:
+                global_delay = self.global_bucket.delay(now)
+                if global_delay:
+                    wait = global_delay if wait is None else min(wait, global_delay)
+                    continue
+            for key, queue in queues.items():
+                if lane == LANE_PREFIX:
+                    bucket = self._channel_bucket(key)
+                    delay = bucket.delay(now)
+                    if delay:
+                        wait = delay if wait is None else min(wait, delay)
+                        continue
+                    bucket.take()
+                    self.global_bucket.take()
+
+                batch = [queue.popleft()]
+                if lane == LANE_PREFIX and batch[0].mergeable:
+                    count = len(batch[0].embeds())
+                    while queue and queue[0].mergeable and count + len(queue[0].embeds()) <= MAX_EMBEDS_PER_MESSAGE:
+                        count += len(queue[0].embeds())
+                        batch.append(queue.popleft())
+                self._depth[lane] -= len(batch)
+                # Rodízio entre canais: quem acabou de enviar vai para o fim
+                del queues[key]
+                if queue:
+                    queues[key] = queue
+                return lane, batch, None
+        return None, None, wait
+
+    async def _worker(self):
+        while True:
+            await self._slots.acquire()
+            while True:
+                lane, batch, wait = self._next_batch(time.monotonic())
+                if batch:
+                    break
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=wait)
+                except asyncio.TimeoutError:
+                    pass
+            self.in_flight += 1
+            task = self._loop.create_task(self._deliver(lane, batch))
+            self._deliveries.add(task)
+            task.add_done_callback(self._deliveries.discard)
+
+    async def _deliver(self, lane, batch):
+        first = batch[0]
+        kwargs = first.kwargs
+        if len(batch) > 1:
+            kwargs = {'embeds': [embed for message in batch for embed in message.embeds()]}
+            self._merged += len(batch) - 1
+        started = time.perf_counter()
+        for message in batch:
+            latency_metrics.record(f'fila:{LANE_NAMES[lane]}', 'espera', int((started - message.queued_at) * 1e6))
+        try:
+            result = await first.send(**kwargs)
+        except Exception as e:
+            for message in batch:
+                if not message.future.done():
+                    message.future.set_exception(e)
+        else:
+            for message in batch:
+                if not message.future.done():
+                    message.future.set_result(result)
+        finally:
+            self._sent[lane] += 1
+            self.in_flight -= 1
+            self._slots.release()
+            self._prune_buckets()
+
+    def _prune_buckets(self):
+        # Canais sem fila e com o balde cheio não precisam de estado
+        if len(self._channel_buckets) < 10000:
+            return
+        now = time.monotonic()
+        waiting = self._lanes[LANE_PREFIX]
+        for channel_id, bucket in list(self._channel_buckets.items()):
+            if channel_id not in waiting and bucket.delay(now) == 0 and bucket.tokens >= bucket.capacity:
+                del self._channel_buckets[channel_id]
+
+    def depth(self):
+        """Mensagens esperando em cada faixa"""
+        return dict(zip(LANE_NAMES, self._depth))
+
+    def prometheus_text(self):
+        lines = [
+            "# HELP vamp_outbound_queue_depth Mensagens esperando na fila de envio, por faixa",
+            "# TYPE vamp_outbound_queue_depth gauge",
+            *(f'vamp_outbound_queue_depth{{lane="{name}"}} {depth}' for name, depth in self.depth().items()),
+            "# HELP vamp_outbound_in_flight Envios em andamento",
+            "# TYPE vamp_outbound_in_flight gauge",
+            f"vamp_outbound_in_flight {self.in_flight}",
+            "# HELP vamp_outbound_sent_total Requisições de envio feitas, por faixa",
+            "# TYPE vamp_outbound_sent_total counter",
+            *(f'vamp_outbound_sent_total{{lane="{name}"}} {sent}' for name, sent in zip(LANE_NAMES, self._sent)),
+            "# HELP vamp_outbound_merged_total Respostas enviadas junto com outras na mesma mensagem",
+            "# TYPE vamp_outbound_merged_total counter",
+            f"vamp_outbound_merged_total {self._merged}",
+        ]
+        return "\n".join(lines) + "\n"
+
+outbound = OutboundQueue(OUTBOUND_GLOBAL_RATE, OUTBOUND_CHANNEL_RATE, OUTBOUND_CHANNEL_BURST, OUTBOUND_CONCURRENCY)
+latency_metrics.add_source(outbound.prometheus_text)
+
+# Sincronização dos comandos slash
+# O hash da árvore de comandos da última sincronização fica em disco: reiniciar ou reconectar
+# sem mudar comandos não chama a API (FORCE_SYNC=1 sincroniza de qualquer jeito)
+TREE_HASH_PATH = os.getenv('TREE_HASH_PATH', 'vamp_tree.hash')
+
+def command_tree_hash(tree, application_id):
+    """Hash do que o tree.sync() enviaria ao Discord (muda com qualquer comando, opção ou descrição)"""
+    payload = sorted((command.to_dict(tree) for command in tree.get_commands()), key=lambda command: command['name'])
+    data = json.dumps([application_id, payload], sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(data.encode()).hexdigest()
+
+async def sync_command_tree(tree, application_id, path):
+    """Sincroniza os comandos slash só quando a árvore mudou desde a última sincronização"""
+    tree_hash = command_tree_hash(tree, application_id)
+    try:
+        with open(path, encoding='utf-8') as file:
+            synced_hash = file.read().strip()
+    except OSError:
+        synced_hash = None
+
+    if tree_hash == synced_hash and os.getenv('FORCE_SYNC') != '1':
+        print("Comandos slash sem mudanças; sincronização ignorada")
+        return
+
+    try:
+        synced = await tree.sync()
+    except Exception as e:
+        print(f"Falha ao sincronizar comandos: {e}")
+        return
+    print(f"Sincronizados {len(synced)} comandos slash")
+    try:
+        await asyncio.to_thread(write_text_atomic, path, tree_hash)
+    except OSError as e:
+        print(f"Falha ao gravar hash dos comandos: {e}")
+
+# Saúde dos shards
+def shard_health():
+    """Situação de cada shard deste processo"""
+    now = time.time()
+    if isinstance(bot, commands.AutoShardedBot):
+        guild_counts = {}
+        for guild in bot.guilds:
+            guild_counts[guild.shard_id] = guild_counts.get(guild.shard_id, 0) + 1
+        shards = [
+            {
+                'shard_id': shard_id,
+                'latency': shard.latency,
+                'closed': shard.is_closed(),
+                'ratelimited': shard.is_ws_ratelimited(),
+                'guilds': guild_counts.get(shard_id, 0),
+            }
+            for shard_id, shard in bot.shards.items()
+        ]
+    else:
+        shards = [{
+            'shard_id': 0,
+            'latency': bot.latency,
+            'closed': bot.is_closed(),
+            'ratelimited': bot.is_ws_ratelimited(),
+            'guilds': len(bot.guilds),
+        }]
+    return {'pid': os.getpid(), 'ready': bot.is_ready(), 'updated_at': now, 'shards': shards}
+
+async def report_shard_health(directory, interval):
+    """Grava periodicamente um arquivo de saúde por shard, lido pelo launcher.py"""
+    os.makedirs(directory, exist_ok=True)
+    while True:
+        health = shard_health()
+        for shard in health['shards']:
+            report = {**shard, 'pid': health['pid'], 'ready': health['ready'], 'updated_at': health['updated_at']}
+            # Latência é infinita antes do primeiro heartbeat; JSON não aceita inf
+            if report['latency'] == float('inf'):
+                report['latency'] = None
+            path = os.path.join(directory, f"shard-{shard['shard_id']}.json")
+            try:
+                await asyncio.to_thread(write_text_atomic, path, json.dumps(report))
+            except OSError as e:
+                print(f"Falha ao gravar saúde do shard {shard['shard_id']}: {e}")
+        await asyncio.sleep(interval)
+
+def roll_origin(source):
+    """Retorna (guild_id, channel_id, user_id) de uma interação ou de um contexto de comando"""
+    if isinstance(source, discord.Interaction):
+        return source.guild_id, source.channel_id, source.user.id
+    return (source.guild.id if source.guild else None), source.channel.id, source.author.id
+
+def rng_scope(source):
+    """Escopo da sequência de dados (RNG_SCOPE): o servidor ou o canal de origem da rolagem"""
+    guild_id, channel_id, user_id = roll_origin(source)
+    if RNG_SCOPE == 'channel' or guild_id is None:
+        return f"c{channel_id}"
+    return f"g{guild_id}"
+
+def record_roll(source, result, user_id=None):
+    """Registra uma rolagem feita a partir de uma interação ou comando de texto
+
+    `user_id` atribui a rolagem a outro jogador (rolagens em grupo feitas por um só clique).
+    """
+    guild_id, channel_id, author_id = roll_origin(source)
+    user_id = author_id if user_id is None else user_id
+    roll_history.record(guild_id, channel_id, user_id, result)
+    player_stats.record(guild_id, user_id, result)
+
+def record_reroll(source, original, result, positions):
+    """Registra a Força de Vontade: a rolagem final no histórico e a troca nas estatísticas"""
+    guild_id, channel_id, user_id = roll_origin(source)
+    roll_history.record(guild_id, channel_id, user_id, result, positions)
+    player_stats.reroll(guild_id, user_id, original, result)
 
 # Modal para definir título
 class TitleModal(discord.ui.Modal, title='📝 Definir Título da Rolagem'):
     def __init__(self, view):
-        super().__init__()
+        # Modais fechados sem envio não geram evento; o timeout libera a memória
+        super().__init__(timeout=600)
         self.view = view
 
     title_input = discord.ui.TextInput(
@@ -87,44 +1748,166 @@ class TitleModal(discord.ui.Modal, title='📝 Definir Título da Rolagem'):
     )
 
     async def on_submit(self, interaction: discord.Interaction):
-        title_text = self.title_input.value.strip()
-        self.view.title = title_text if title_text else None
-        embed = self.view.create_embed()
-        await interaction.response.edit_message(embed=embed, view=self.view)
+        title_text = self.title_input.value.strip() or None
+        # Parte do painel como está agora, não de quando o modal abriu
+        view = panel_view(interaction.message) or self.view
+        await panel_edits.apply(interaction, view, lambda target: setattr(target, 'title', title_text))
+
+# Cache de respostas
+class FrozenEmbed(discord.Embed):
+    """Embed congelado: to_dict() devolve sempre o mesmo dict, montado uma única vez
+
+    Compartilhado entre mensagens; não deve ser alterado depois de criado.
+    """
+
+    @classmethod
+    def freeze(cls, embed):
+        payload = embed.to_dict()
+        frozen = cls.from_dict(payload)
+        frozen._payload = payload
+        return frozen
+
+    def to_dict(self):
+        return self._payload
+
+def cached_embed(maxsize):
+    """Memoiza um construtor de embed pelos parâmetros; o resultado é um FrozenEmbed compartilhado"""
+    def decorator(build):
+        @lru_cache(maxsize=maxsize)
+        @wraps(build)
+        def cached(*args):
+            return FrozenEmbed.freeze(build(*args))
+        return cached
+    return decorator
+
+class ResponseCooldowns:
+    """Última resposta de cada tipo por canal: repetir dentro da janela aponta para ela"""
+
+    def __init__(self, window, max_entries=10000):
+        self.window = window
+        self.max_entries = max_entries
+        # (guild_id, channel_id, nome) -> (momento, link da mensagem), do mais antigo ao mais novo
+        self._recent = OrderedDict()
+
+    def recent(self, guild_id, channel_id, name):
+        """Link da resposta anterior ainda dentro da janela, ou None"""
+        entry = self._recent.get((guild_id, channel_id, name))
+        if entry is None or time.monotonic() - entry[0] > self.window:
+            return None
+        return entry[1]
+
+    def remember(self, guild_id, channel_id, name, message):
+        if message is None or self.window <= 0:
+            return
+        key = (guild_id, channel_id, name)
+        self._recent[key] = (time.monotonic(), message.jump_url)
+        self._recent.move_to_end(key)
+        while len(self._recent) > self.max_entries:
+            self._recent.popitem(last=False)
+
+# Janela (segundos) em que um novo !ajuda_vamp no mesmo canal só aponta para a ajuda anterior
+HELP_COOLDOWN = float(os.getenv('HELP_COOLDOWN', '120'))
+response_cooldowns = ResponseCooldowns(HELP_COOLDOWN)
+
+# Fragmentos do embed de resultado, montados uma única vez na importação
+def _die_token(roll, is_hunger):
+    """Representação visual de um dado"""
+    if is_hunger:
+        # Dados de fome - usar emojis diferentes
+        if roll == 1:
+            return f"🩸**{roll}**"  # Falha bestial
+        if roll == 10:
+            return f"🔥**{roll}**"  # Sucesso bestial potencial (2 sucessos)
+        if roll >= 6:
+            return f"🩸✅`{roll}`"  # Sucesso de fome
+        return f"🩸❌{roll}"  # Falha de fome
+
+    # Dados normais
+    if roll == 1:
+        return f"💀**{roll}**"  # Falha crítica (reduz sucesso)
+    if roll == 10:
+        return f"⭐**{roll}**"  # Sucesso crítico (2 sucessos)
+    if roll >= 6:
+        return f"✅`{roll}`"  # Sucesso normal
+    return f"❌{roll}"  # Falha normal
+
+# Indexados pelo valor do dado (posição 0 não é usada)
+HUNGER_DIE_TOKENS = tuple(_die_token(roll, True) for roll in range(11))
+NORMAL_DIE_TOKENS = tuple(_die_token(roll, False) for roll in range(11))
+
+# Campo de resultado final e cor do embed
+OUTCOME_FIELDS = {
+    OUTCOME_BESTIAL_FAILURE: ("🩸 FALHA BESTIAL", "Falhou no teste e rolou 1 nos dados de fome!", 0x800000),
+    OUTCOME_BESTIAL_SUCCESS: ("🔥 SUCESSO BESTIAL", "Falhou no teste mas rolou 10 nos dados de fome!", 0xFF4500),
+    OUTCOME_SUCCESS: ("✅ SUCESSO", "Teste bem-sucedido!", 0x228B22),
+    OUTCOME_FAILURE: ("❌ FALHA", "Não atingiu o número necessário de sucessos", 0x696969),
+}
+
+# Vitória crítica (par de 10s): com ou sem dado de fome entre os 10s
+CRITICAL_FIELDS = {
+    False: ("⭐ SUCESSO CRÍTICO", "Par de 10s: vitória crítica!", 0xFFD700),
+    True: ("💥 CRÍTICO BAGUNÇADO", "Par de 10s com dado de fome: vitória crítica, mas a Besta cobra seu preço!", 0xB22222),
+}
+
+def outcome_field(result):
+    """(nome, texto, cor) do campo de resultado final"""
+    if result.critical_win:
+        return CRITICAL_FIELDS[result.messy_critical]
+    return OUTCOME_FIELDS[result.outcome]
+
+RESULT_LEGEND = "🩸 = Dado de Fome | ✅ = Sucesso | ❌ = Falha | 💀 = Falha Crítica | ⭐ = Sucesso Crítico (2 sucessos) | 🔥 = Potencial Bestial"
 
 def format_dice_results(result):
     """Formata os resultados dos dados para exibição"""
+    results = result.results
+    hunger = result.hunger
+    return " ".join([
+        *map(HUNGER_DIE_TOKENS.__getitem__, results[:hunger]),
+        *map(NORMAL_DIE_TOKENS.__getitem__, results[hunger:]),
+    ])
+
+@lru_cache(maxsize=256)
+def _result_title(title):
+    if title:
+        return f"🎲 {title} - Vampiro V5"
+    return "🎲 Resultado da Rolagem - Vampiro V5"
+
+@lru_cache(maxsize=1024)
+def _parameters_block(dice_count, difficulty, hunger):
+    return f"**Dados:** {dice_count}\n**Dificuldade:** {difficulty}\n**Fome:** {hunger}"
+
+@lru_cache(maxsize=4096)
+def _successes_block(successes, difficulty, regular_successes, critical_successes, total_ones):
+    success_text = f"**{successes}** de {difficulty} necessários\n"
+    raw_successes = regular_successes + 2 * critical_successes
     
-    # Criar representação visual dos dados
-    dice_display = []
-    for i, roll in enumerate(result.results):
-        if i < result.hunger:
-            # Dados de fome - usar emojis diferentes
-            if roll == 1:
-                dice_display.append(f"🩸**{roll}**")  # Falha bestial
-            elif roll == 10:
-                dice_display.append(f"🔥**{roll}**")  # Sucesso bestial potencial (2 sucessos)
-            elif roll >= 6:
-                dice_display.append(f"🩸✅`{roll}`")  # Sucesso de fome
-            else:
-                dice_display.append(f"🩸❌{roll}")  # Falha de fome
-        else:
-            # Dados normais
-            if roll == 1:
-                dice_display.append(f"💀**{roll}**")  # Falha crítica (reduz sucesso)
-            elif roll == 10:
-                dice_display.append(f"⭐**{roll}**")  # Sucesso crítico (2 sucessos)
-            elif roll >= 6:
-                dice_display.append(f"✅`{roll}`")  # Sucesso normal
-            else:
-                dice_display.append(f"❌{roll}")  # Falha normal
+    # Detalhamento dos sucessos
+    details = []
+    if regular_successes > 0:
+        details.append(f"{regular_successes} sucessos normais")
+    if critical_successes > 0:
+        details.append(f"{critical_successes} críticos (×2)")
+    if total_ones > 0:
+        details.append(f"{total_ones} falhas críticas")
     
-    return " ".join(dice_display)
+    if details:
+        if total_ones > 0:
+            success_text += f"*({' + '.join(details[:-1])} - {details[-1]} = {raw_successes} - {total_ones})*"
+        else:
+            success_text += f"*({' + '.join(details)} = {raw_successes})*"
+    return success_text
 
 # Modal para entrada de valores
 class DiceRollModal(discord.ui.Modal, title='🎲 Configurar Rolagem de Dados'):
-    def __init__(self):
-        super().__init__()
+    def __init__(self, view=None):
+        super().__init__(timeout=600)
+        # Aberto de um painel de grupo: em vez de rolar, registra a parada do jogador no grupo
+        self.view = view
+        if view is not None:
+            self.remove_item(self.title_input)
+            self.dice_count.default = str(view.dice_count)
+            self.difficulty.default = str(view.difficulty)
+            self.hunger.default = str(view.hunger)
 
     title_input = discord.ui.TextInput(
         label='Título da Rolagem (Opcional)',
@@ -166,333 +1949,1365 @@ class DiceRollModal(discord.ui.Modal, title='🎲 Configurar Rolagem de Dados'):
             title = self.title_input.value.strip() if self.title_input.value.strip() else None
             
             # Validações
-            if dice <= 0 or dice > 20:
-                await interaction.response.send_message("❌ Número de dados deve estar entre 1 e 20", ephemeral=True)
+            error = validate_roll(dice, diff, hung)
+            if error:
+                await outbound.respond(interaction, f"❌ {error}", ephemeral=True)
                 return
             
-            if diff <= 0 or diff > 10:
-                await interaction.response.send_message("❌ Dificuldade deve estar entre 1 e 10", ephemeral=True)
-                return
-                
-            if hung < 0 or hung > 5:
-                await interaction.response.send_message("❌ Nível de fome deve estar entre 0 e 5", ephemeral=True)
-                return
-                
-            if hung > dice:
-                await interaction.response.send_message("❌ Nível de fome não pode ser maior que o número de dados", ephemeral=True)
+            if self.view is not None:
+                # Parte do grupo como está agora: quem entrou ou saiu com o modal aberto continua lá
+                view = panel_view(interaction.message) or self.view
+                await view.join_group(interaction, (dice, diff, hung))
                 return
             
             # Rolar os dados
-            result = roll_vampire_dice(dice, diff, hung, title)
+            trace = latency_metrics.trace('modal')
+            result = roll_vampire_dice(dice, diff, hung, title, rng_scope(interaction))
+            record_roll(interaction, result)
+            trace.mark('roll')
             embed = create_result_embed(result)
-            await interaction.response.send_message(embed=embed)
+            trace.mark('render')
+            await outbound.respond(interaction, embed=embed, view=result_view(interaction.user.id, result))
+            trace.mark('send')
+            trace.finish()
             
         except ValueError:
-            await interaction.response.send_message("❌ Por favor, digite apenas números válidos", ephemeral=True)
+            await outbound.respond(interaction, "❌ Por favor, digite apenas números válidos", ephemeral=True)
 
-# View com botões interativos
-class DiceConfigView(discord.ui.View):
-    def __init__(self):
-        super().__init__(timeout=300)  # 5 minutos de timeout
-        self.dice_count = 5
-        self.difficulty = 3
-        self.hunger = 0
-        self.title = None
-    
-    def create_embed(self):
+# Botões do painel: ação (nome do método em DiceConfigView) -> (rótulo, estilo, linha)
+CONFIG_BUTTONS = {
+    'dice_minus': ('Dados -', discord.ButtonStyle.red, 0),
+    'dice_plus': ('Dados +', discord.ButtonStyle.green, 0),
+    'difficulty_minus': ('Dif -', discord.ButtonStyle.red, 1),
+    'difficulty_plus': ('Dif +', discord.ButtonStyle.green, 1),
+    'hunger_minus': ('Fome -', discord.ButtonStyle.red, 2),
+    'hunger_plus': ('Fome +', discord.ButtonStyle.green, 2),
+    'roll_dice': ('🎲 ROLAR DADOS', discord.ButtonStyle.primary, 3),
+    'set_title': ('📝 Título', discord.ButtonStyle.secondary, 3),
+    'manual_input': ('✏️ Entrada Manual', discord.ButtonStyle.secondary, 4),
+}
+
+# Botões que só ajustam valores (os demais abrem modais ou rolam os dados)
+PANEL_ADJUSTMENTS = frozenset((
+    'dice_minus', 'dice_plus', 'difficulty_minus', 'difficulty_plus', 'hunger_minus', 'hunger_plus',
+))
+
+# Painel de grupo: mesmos ajustes, mas cada jogador entra com a parada e um clique rola todas
+GROUP_BUTTONS = {
+    **{action: button for action, button in CONFIG_BUTTONS.items() if action in PANEL_ADJUSTMENTS},
+    'group_join': ('➕ Entrar', discord.ButtonStyle.green, 3),
+    'group_leave': ('➖ Sair', discord.ButtonStyle.secondary, 3),
+    'set_title': CONFIG_BUTTONS['set_title'],
+    'group_roll': ('🎲 ROLAR GRUPO', discord.ButtonStyle.primary, 4),
+    'manual_input': CONFIG_BUTTONS['manual_input'],
+}
+
+# Modo do painel (parte do custom_id) -> botões
+PANEL_BUTTONS = {'cfg': CONFIG_BUTTONS, 'grp': GROUP_BUTTONS}
+
+# Jogadores por grupo (cada linha do grupo ocupa ~50 dos 1024 caracteres do campo)
+GROUP_MEMBER_LIMIT = 15
+GROUP_PAGE_SIZE = 5
+
+# Janela (segundos) para juntar cliques seguidos em uma só edição; 0 edita a cada clique
+PANEL_COALESCE_WINDOW = float(os.getenv('PANEL_COALESCE_WINDOW', '0.35'))
+
+TITLE_FIELD_NAME = "📝 Título"
+
+def panel_title(message):
+    """Lê o título do próprio embed do painel (não cabe no custom_id)"""
+    if message is None or not message.embeds:
+        return None
+    for field in message.embeds[0].fields:
+        if field.name == TITLE_FIELD_NAME:
+            return field.value.removeprefix("**").removesuffix("**") or None
+    return None
+
+GROUP_FIELD_NAME = "👥 Grupo"
+GROUP_MEMBER_LINE = re.compile(r'<@(\d+)> · (\d+) dados, dif (\d+), fome (\d+)')
+
+def format_group_member(user_id, pool):
+    dice_count, difficulty, hunger = pool
+    return f"<@{user_id}> · {dice_count} dados, dif {difficulty}, fome {hunger}"
+
+def panel_group(message):
+    """Lê os jogadores do grupo do embed do painel: user_id -> (dados, dificuldade, fome)"""
+    group = {}
+    if message is None or not message.embeds:
+        return group
+    for field in message.embeds[0].fields:
+        if field.name == GROUP_FIELD_NAME:
+            for match in GROUP_MEMBER_LINE.finditer(field.value):
+                group[int(match[1])] = (int(match[2]), int(match[3]), int(match[4]))
+    return group
+
+@cached_embed(maxsize=4096)
+def panel_embed(dice_count, difficulty, hunger, title, group):
+    """Embed do painel para um estado (`group`: tupla de (user_id, parada) ou None fora do modo grupo)"""
+    if group is None:
         embed = discord.Embed(
             title="🎛️ Configurador de Dados - Vampiro V5",
             description="Use os botões abaixo para ajustar os valores e depois role os dados!",
             color=0x8B0000
         )
-        
-        # Mostrar título se definido
-        if self.title:
-            embed.add_field(
-                name="📝 Título",
-                value=f"**{self.title}**",
-                inline=False
-            )
-        
-        embed.add_field(
-            name="🎲 Dados",
-            value=f"**{self.dice_count}**",
-            inline=True
+    else:
+        embed = discord.Embed(
+            title="👥 Rolagem em Grupo - Vampiro V5",
+            description="Ajuste a parada e clique em **➕ Entrar** (ou use a entrada manual). "
+                        "**🎲 ROLAR GRUPO** rola todos de uma vez!",
+            color=0x8B0000
         )
-        
+
+    # Mostrar título se definido
+    if title:
         embed.add_field(
-            name="🎯 Dificuldade", 
-            value=f"**{self.difficulty}**",
-            inline=True
+            name=TITLE_FIELD_NAME,
+            value=f"**{title}**",
+            inline=False
         )
-        
+
+    embed.add_field(
+        name="🎲 Dados",
+        value=f"**{dice_count}**",
+        inline=True
+    )
+
+    embed.add_field(
+        name="🎯 Dificuldade", 
+        value=f"**{difficulty}**",
+        inline=True
+    )
+
+    embed.add_field(
+        name="🩸 Fome",
+        value=f"**{hunger}**",
+        inline=True
+    )
+
+    if group is not None:
+        members = "\n".join(format_group_member(user_id, pool) for user_id, pool in group)
         embed.add_field(
-            name="🩸 Fome",
-            value=f"**{self.hunger}**",
-            inline=True
+            name=GROUP_FIELD_NAME,
+            value=members or "*Ninguém entrou ainda*",
+            inline=False
         )
-        
-        embed.set_footer(text="💡 Clique nos botões para ajustar os valores")
-        return embed
 
+    embed.set_footer(text="💡 Clique nos botões para ajustar os valores")
+    return embed
+
+# Botão do painel com o estado guardado no próprio custom_id
+PANEL_CUSTOM_ID = re.compile(r'vamp:(?P<mode>cfg|grp):(?P<action>[a-z_]+):(?P<dice>\d+):(?P<difficulty>\d+):(?P<hunger>\d+)')
+
+class DiceConfigButton(discord.ui.DynamicItem[discord.ui.Button], template=PANEL_CUSTOM_ID):
+    def __init__(self, action, dice_count, difficulty, hunger, mode='cfg'):
+        label, style, row = PANEL_BUTTONS[mode][action]
+        super().__init__(
+            discord.ui.Button(
+                label=label,
+                style=style,
+                row=row,
+                custom_id=f'vamp:{mode}:{action}:{dice_count}:{difficulty}:{hunger}'
+            )
+        )
+        self.mode = mode
+        self.action = action
+        self.dice_count = dice_count
+        self.difficulty = difficulty
+        self.hunger = hunger
+
+    @classmethod
+    async def from_custom_id(cls, interaction: discord.Interaction, item: discord.ui.Button, match):
+        return cls(match['action'], int(match['dice']), int(match['difficulty']), int(match['hunger']), match['mode'])
+
+    async def callback(self, interaction: discord.Interaction):
+        # Cliques ainda não exibidos valem mais que o custom_id (ex.: "Dados +" seguido de "Rolar")
+        view = panel_edits.latest(interaction.message.id)
+        if view is None:
+            # Como o título, os jogadores do grupo ficam no embed do próprio painel
+            group = panel_group(interaction.message) if self.mode == 'grp' else None
+            view = DiceConfigView(self.dice_count, self.difficulty, self.hunger, panel_title(interaction.message), group)
+        view.trace = latency_metrics.trace(f'dados:{self.action}')
+        if self.action in PANEL_ADJUSTMENTS:
+            await panel_edits.adjust(interaction, view, self.action)
+        else:
+            await getattr(view, self.action)(interaction)
+        view.trace.finish()
+
+# View com botões interativos
+# O painel não guarda estado em memória: cada clique reconstrói a view a partir do custom_id,
+# então um único registro (DiceConfigButton) atende todos os painéis, inclusive após reiniciar.
+class DiceConfigView(discord.ui.View):
+    def __init__(self, dice_count=5, difficulty=3, hunger=0, title=None, group=None):
+        super().__init__(timeout=None)
+        self.dice_count = dice_count
+        self.difficulty = difficulty
+        self.hunger = hunger
+        self.title = title
+        # Modo grupo: user_id -> (dados, dificuldade, fome) de cada jogador inscrito
+        self.group = group
+        self.trace = latency_metrics.trace('dados')
+        self.refresh_buttons()
+        # A view só descreve os componentes; parada, o discord.py não a guarda por mensagem
+        self.stop()
+
+    @property
+    def mode(self):
+        return 'cfg' if self.group is None else 'grp'
+
+    def copy(self):
+        group = dict(self.group) if self.group is not None else None
+        return DiceConfigView(self.dice_count, self.difficulty, self.hunger, self.title, group)
+
+    def refresh_buttons(self):
+        self.clear_items()
+        mode = self.mode
+        for action in PANEL_BUTTONS[mode]:
+            self.add_item(DiceConfigButton(action, self.dice_count, self.difficulty, self.hunger, mode))
+    
+    def create_embed(self):
+        group = tuple(self.group.items()) if self.group is not None else None
+        return panel_embed(self.dice_count, self.difficulty, self.hunger, self.title, group)
+
+    @property
+    def state(self):
+        if self.group is None:
+            return (self.dice_count, self.difficulty, self.hunger, self.title)
+        return (self.dice_count, self.difficulty, self.hunger, self.title, tuple(self.group.items()))
+
+    async def update_panel(self, interaction: discord.Interaction):
+        self.refresh_buttons()
+        embed = self.create_embed()
+        self.trace.mark('render')
+        await interaction.response.edit_message(embed=embed, view=self)
+        self.trace.mark('send')
+
+    # Ajustes dos valores (só mudam o estado; quem edita a mensagem é o PanelEditCoalescer)
     # Botões para dados
-    @discord.ui.button(label='Dados -', style=discord.ButtonStyle.red, row=0)
-    async def dice_minus(self, interaction: discord.Interaction, button: discord.ui.Button):
+    def dice_minus(self):
         if self.dice_count > 1:
             self.dice_count -= 1
             # Ajustar fome se necessário
             if self.hunger > self.dice_count:
                 self.hunger = self.dice_count
-        await interaction.response.edit_message(embed=self.create_embed(), view=self)
 
-    @discord.ui.button(label='Dados +', style=discord.ButtonStyle.green, row=0)
-    async def dice_plus(self, interaction: discord.Interaction, button: discord.ui.Button):
+    def dice_plus(self):
         if self.dice_count < 20:
             self.dice_count += 1
-        await interaction.response.edit_message(embed=self.create_embed(), view=self)
 
     # Botões para dificuldade
-    @discord.ui.button(label='Dif -', style=discord.ButtonStyle.red, row=1)
-    async def difficulty_minus(self, interaction: discord.Interaction, button: discord.ui.Button):
+    def difficulty_minus(self):
         if self.difficulty > 1:
             self.difficulty -= 1
-        await interaction.response.edit_message(embed=self.create_embed(), view=self)
 
-    @discord.ui.button(label='Dif +', style=discord.ButtonStyle.green, row=1)
-    async def difficulty_plus(self, interaction: discord.Interaction, button: discord.ui.Button):
+    def difficulty_plus(self):
         if self.difficulty < 10:
             self.difficulty += 1
-        await interaction.response.edit_message(embed=self.create_embed(), view=self)
 
-    # Botões para fome
-    @discord.ui.button(label='Fome -', style=discord.ButtonStyle.red, row=2)
-    async def hunger_minus(self, interaction: discord.Interaction, button: discord.ui.Button):
-        if self.hunger > 0:
-            self.hunger -= 1
-        await interaction.response.edit_message(embed=self.create_embed(), view=self)
+    # Botões para fome
+    def hunger_minus(self):
+        if self.hunger > 0:
+            self.hunger -= 1
+
+    def hunger_plus(self):
+        if self.hunger < 5 and self.hunger < self.dice_count:
+            self.hunger += 1
+
+    # Botão principal para rolar
+    async def roll_dice(self, interaction: discord.Interaction):
+        try:
+            result = roll_vampire_dice(self.dice_count, self.difficulty, self.hunger, self.title, rng_scope(interaction))
+            record_roll(interaction, result)
+            self.trace.mark('roll')
+            embed = create_result_embed(result)
+            self.trace.mark('render')
+            await outbound.respond(interaction, embed=embed, view=result_view(interaction.user.id, result))
+            self.trace.mark('send')
+        except Exception as e:
+            await outbound.respond(interaction, f"❌ Erro: {str(e)}", ephemeral=True)
+
+    # Botão para definir título
+    async def set_title(self, interaction: discord.Interaction):
+        modal = TitleModal(self)
+        await interaction.response.send_modal(modal)
+
+    # Botão para abrir modal de entrada manual
+    async def manual_input(self, interaction: discord.Interaction):
+        modal = DiceRollModal(self if self.group is not None else None)
+        await interaction.response.send_modal(modal)
+
+    # Modo grupo
+    def set_member(self, user_id, pool):
+        if user_id in self.group or len(self.group) < GROUP_MEMBER_LIMIT:
+            self.group[user_id] = pool
+
+    async def join_group(self, interaction: discord.Interaction, pool=None):
+        """Inscreve (ou atualiza) a parada de quem clicou; sem `pool`, usa a do painel"""
+        user_id = interaction.user.id
+        if user_id not in self.group and len(self.group) >= GROUP_MEMBER_LIMIT:
+            await outbound.respond(interaction, f"❌ O grupo já tem {GROUP_MEMBER_LIMIT} jogadores", ephemeral=True)
+            return
+        if pool is None:
+            # Estado de quando o painel for editado, inclusive cliques ainda não exibidos
+            change = lambda view: view.set_member(user_id, (view.dice_count, view.difficulty, view.hunger))
+        else:
+            change = lambda view: view.set_member(user_id, pool)
+        await panel_edits.apply(interaction, self, change)
+
+    async def group_join(self, interaction: discord.Interaction):
+        await self.join_group(interaction)
+
+    async def group_leave(self, interaction: discord.Interaction):
+        user_id = interaction.user.id
+        await panel_edits.apply(interaction, self, lambda view: view.group.pop(user_id, None))
+
+    async def group_roll(self, interaction: discord.Interaction):
+        if not self.group:
+            await outbound.respond(interaction, "❌ Ninguém entrou no grupo ainda: use **➕ Entrar**", ephemeral=True)
+            return
+        try:
+            # Todas as paradas em um único sorteio, cada resultado atribuído ao seu jogador
+            members = list(self.group.items())
+            specs = [RollSpec(dice, difficulty, hunger, self.title) for _, (dice, difficulty, hunger) in members]
+            results = roll_vampire_pools(specs, rng_scope(interaction))
+            for (user_id, _), result in zip(members, results):
+                record_roll(interaction, result, user_id)
+            self.trace.mark('roll')
+            view = GroupResultView(rank_group_results(zip((user_id for user_id, _ in members), results)), self.title)
+            embed = view.create_embed()
+            self.trace.mark('render')
+            await outbound.respond(interaction, embed=embed, view=view)
+            self.trace.mark('send')
+        except Exception as e:
+            await outbound.respond(interaction, f"❌ Erro: {str(e)}", ephemeral=True)
+
+class PendingPanelEdit:
+    """Estado acumulado de um painel enquanto a janela de edição está aberta"""
+
+    __slots__ = ('view', 'shown_state', 'interaction')
+
+    def __init__(self, view, interaction):
+        self.view = view
+        self.shown_state = view.state  # O que a mensagem mostra hoje
+        self.interaction = interaction
+
+class PanelEditCoalescer:
+    """Confirma cada clique na hora e junta os cliques de uma janela em uma única edição"""
+
+    def __init__(self, window):
+        self.window = window
+        # message_id -> PendingPanelEdit; existe da primeira clicada até a edição terminar
+        self._pending = {}
+        self._tasks = set()
+
+    def latest(self, message_id):
+        """Cópia do estado do painel com os cliques ainda não exibidos (None se não há nenhum)"""
+        pending = self._pending.get(message_id)
+        return pending.view.copy() if pending is not None else None
+
+    async def adjust(self, interaction: discord.Interaction, view, action):
+        await self.apply(interaction, view, lambda target: getattr(target, action)())
+
+    async def apply(self, interaction: discord.Interaction, view, change):
+        """Aplica `change(view)` ao estado do painel e agenda a edição da mensagem"""
+        if self.window <= 0:
+            shown_state = view.state
+            change(view)
+            if view.state == shown_state:
+                # Nada mudou (ex.: Dados + no limite de 20): só confirma o clique
+                await interaction.response.defer()
+            else:
+                await view.update_panel(interaction)
+            return
+
+        message_id = interaction.message.id
+        pending = self._pending.get(message_id)
+        if pending is None:
+            pending = self._pending[message_id] = PendingPanelEdit(view, interaction)
+            task = asyncio.get_running_loop().create_task(self._flush_later(message_id))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+        # O estado muda antes de qualquer await para não perder cliques intercalados
+        change(pending.view)
+        pending.interaction = interaction
+        await interaction.response.defer()
+        view.trace.mark('ack')
+
+    async def _flush_later(self, message_id):
+        pending = self._pending[message_id]
+        try:
+            # A entrada só sai depois da edição: cliques durante o envio continuam acumulando
+            # sobre este estado e, se houver, geram mais uma edição
+            while True:
+                await asyncio.sleep(self.window)
+                view = pending.view
+                state = view.state
+                if state == pending.shown_state:
+                    return
+
+                trace = latency_metrics.trace('dados:edicao')
+                view.refresh_buttons()
+                embed = view.create_embed()
+                trace.mark('render')
+                try:
+                    # Edita pelo token da interação mais recente (válido por 15 minutos)
+                    await outbound.edit_original(pending.interaction, embed=embed, view=view)
+                except discord.HTTPException as e:
+                    print(f"Falha ao atualizar painel: {e}")
+                    return
+                pending.shown_state = state
+                trace.mark('send')
+                trace.finish()
+        finally:
+            del self._pending[message_id]
+
+panel_edits = PanelEditCoalescer(PANEL_COALESCE_WINDOW)
+
+def panel_view(message):
+    """Estado atual de um painel: cliques ainda não exibidos ou, sem eles, a própria mensagem
+
+    Modais ficam abertos por até 10 minutos; a view de quando foram abertos pode estar velha.
+    """
+    if message is None:
+        return None
+    view = panel_edits.latest(message.id)
+    if view is not None:
+        return view
+    for row in message.components:
+        for component in getattr(row, 'children', ()):
+            match = PANEL_CUSTOM_ID.fullmatch(getattr(component, 'custom_id', None) or '')
+            if match:
+                group = panel_group(message) if match['mode'] == 'grp' else None
+                return DiceConfigView(
+                    int(match['dice']), int(match['difficulty']), int(match['hunger']), panel_title(message), group,
+                )
+    return None
+
+WILLPOWER_FIELD_NAME = "💪 Força de Vontade"
+
+def create_result_embed(result, rerolls=None):
+    """Cria o embed com os resultados da rolagem
+
+    `rerolls` lista os pares (antes, depois) dos dados trocados com Força de Vontade.
+    """
+    outcome_name, outcome_value, color = outcome_field(result)
+    
+    embed = discord.Embed(
+        title=_result_title(result.title),
+        color=color
+    )
+    
+    # Adicionar informações da rolagem
+    embed.add_field(
+        name="📊 Parâmetros",
+        value=_parameters_block(result.dice_count, result.difficulty, result.hunger),
+        inline=True
+    )
+    
+    # Mostrar resultados dos dados
+    embed.add_field(
+        name="🎯 Resultados dos Dados",
+        value=format_dice_results(result),
+        inline=False
+    )
+    
+    # Mostrar sucessos com detalhamento completo
+    embed.add_field(
+        name="✨ Sucessos",
+        value=_successes_block(
+            result.successes, result.difficulty,
+            result.regular_successes, result.critical_successes, result.total_ones,
+        ),
+        inline=True
+    )
+    
+    if rerolls:
+        embed.add_field(
+            name=WILLPOWER_FIELD_NAME,
+            value=" · ".join(f"{NORMAL_DIE_TOKENS[before]} → {NORMAL_DIE_TOKENS[after]}" for before, after in rerolls),
+            inline=False
+        )
+    
+    # Resultado final
+    embed.add_field(name=outcome_name, value=outcome_value, inline=False)
+    
+    # Adicionar legenda
+    embed.set_footer(text=RESULT_LEGEND)
+    
+    return embed
+
+def rank_group_results(entries):
+    """Ordena (user_id, resultado) como uma iniciativa: mais sucessos, depois mais críticos, depois menos 1s"""
+    return sorted(
+        entries,
+        key=lambda entry: (-entry[1].successes, -entry[1].critical_successes, entry[1].total_ones),
+    )
+
+def create_group_result_embed(entries, page, title=None):
+    """Cria uma página do embed de resultados de uma rolagem em grupo"""
+    pages = (len(entries) + GROUP_PAGE_SIZE - 1) // GROUP_PAGE_SIZE
+    outcomes = Counter(result.outcome for _, result in entries)
+    embed = discord.Embed(
+        title=f"👥 {title} - Vampiro V5" if title else "👥 Rolagem em Grupo - Vampiro V5",
+        description=" · ".join(
+            f"{OUTCOME_EMOJIS[outcome]} {outcomes[outcome]}" for outcome in OUTCOME_EMOJIS if outcomes[outcome]
+        ),
+        color=0x8B0000
+    )
+
+    start = page * GROUP_PAGE_SIZE
+    for rank, (user_id, result) in enumerate(entries[start:start + GROUP_PAGE_SIZE], start + 1):
+        outcome_name = outcome_field(result)[0]
+        embed.add_field(
+            name=f"{rank}º · {outcome_name} · {result.successes}/{result.difficulty} sucessos",
+            value=f"<@{user_id}> · {result.dice_count} dados, fome {result.hunger}\n{format_dice_results(result)}",
+            inline=False
+        )
+
+    embed.set_footer(text=f"Página {page + 1}/{pages} · {len(entries)} jogadores | {RESULT_LEGEND}")
+    return embed
+
+def create_rouse_embed(check):
+    """Cria o embed de um ou mais Testes de Despertar"""
+    failures = sum(1 for die in check.dice if die < 6)
+    embed = discord.Embed(
+        title="🩸 Teste de Despertar - Vampiro V5",
+        color=0x800000 if failures else 0x228B22
+    )
+    embed.add_field(
+        name="🎯 Resultados",
+        value=" ".join(f"✅`{die}`" if die >= 6 else f"❌{die}" for die in check.dice),
+        inline=False
+    )
+    if check.hunger_after > check.hunger_before:
+        hunger_text = f"**{check.hunger_before} → {check.hunger_after}** A fome aumentou!"
+    else:
+        hunger_text = f"**{check.hunger_before}** A fome não mudou."
+    # Na fome 5 a fome não sobe: cada falha a mais exige um teste de frenesi de fome
+    if check.hunger_before + failures > 5:
+        hunger_text += "\n⚠️ Fome no máximo: a Besta exige um teste de frenesi de fome!"
+    embed.add_field(name="🩸 Fome", value=hunger_text, inline=False)
+    embed.set_footer(text="6 ou mais = passou | abaixo de 6 = fome +1")
+    return embed
+
+def embed_roll_title(message):
+    """Título da rolagem lido do embed de resultado (ver _result_title)"""
+    if message is None or not message.embeds or not message.embeds[0].title:
+        return None
+    title = message.embeds[0].title
+    if title == _result_title(None):
+        return None
+    return title.removeprefix("🎲 ").removesuffix(" - Vampiro V5") or None
+
+# Botão de Força de Vontade: os dados, o dono e a parada ficam no custom_id (1-9 e 0 para o 10)
+# Mensagens em que a Força de Vontade já foi gasta: cliques quase simultâneos (ou de dois
+# aparelhos) chegam antes da edição que tira o botão. Só as mais recentes ficam guardadas.
+WILLPOWER_SPENT_LIMIT = 10000
+willpower_spent = OrderedDict()
+
+def willpower_used(message):
+    """Força de Vontade já gasta nesta mensagem (clique em andamento ou troca já no embed)"""
+    if message.id in willpower_spent:
+        return True
+    return any(field.name == WILLPOWER_FIELD_NAME for embed in message.embeds[:1] for field in embed.fields)
+
+class WillpowerRerollButton(discord.ui.DynamicItem[discord.ui.Button], template=r'vamp:wp:(?P<user>\d+):(?P<difficulty>\d+):(?P<hunger>\d):(?P<dice>\d+)'):
+    def __init__(self, user_id, difficulty, hunger, dice):
+        dice_text = "".join(str(die % 10) for die in dice)
+        super().__init__(
+            discord.ui.Button(
+                label='💪 Reroll (Força de Vontade)',
+                style=discord.ButtonStyle.secondary,
+                custom_id=f'vamp:wp:{user_id}:{difficulty}:{hunger}:{dice_text}'
+            )
+        )
+        self.user_id = user_id
+        self.difficulty = difficulty
+        self.hunger = hunger
+        self.dice = bytes(dice)
+
+    @classmethod
+    async def from_custom_id(cls, interaction: discord.Interaction, item: discord.ui.Button, match):
+        dice = bytes(int(digit) or 10 for digit in match['dice'])
+        return cls(int(match['user']), int(match['difficulty']), int(match['hunger']), dice)
+
+    async def callback(self, interaction: discord.Interaction):
+        if interaction.user.id != self.user_id:
+            await outbound.respond(interaction, "❌ Só quem rolou os dados pode gastar Força de Vontade nesta rolagem", ephemeral=True)
+            return
+
+        message = interaction.message
+        # Marca antes de qualquer await: um segundo clique já encontra a mensagem marcada
+        if willpower_used(message):
+            await outbound.respond(interaction, "❌ A Força de Vontade já foi usada nesta rolagem", ephemeral=True)
+            return
+        willpower_spent[message.id] = True
+        while len(willpower_spent) > WILLPOWER_SPENT_LIMIT:
+            willpower_spent.popitem(last=False)
+
+        trace = latency_metrics.trace('forca_de_vontade')
+        title = embed_roll_title(message)
+        original = VampireDiceResult(self.difficulty, self.hunger, self.dice, title)
+        result = VampireDiceResult(self.difficulty, self.hunger, self.dice, title)
+        positions = result.willpower_targets()
+        before = [result.results[position] for position in positions]
+        # A posição dos dados novos vai para o histórico: o /verificar refaz o reroll
+        dice, result.rng_position = dice_rng.draw(rng_scope(interaction), len(positions))
+        result.reroll(positions, dice)
+        trace.mark('roll')
+        embed = create_result_embed(result, list(zip(before, dice)))
+        trace.mark('render')
+        # Edita a própria mensagem e tira o botão: Força de Vontade só uma vez por rolagem
+        try:
+            await interaction.response.edit_message(embed=embed, view=None)
+        except discord.HTTPException:
+            # A troca não chegou à mensagem: o jogador pode tentar de novo
+            del willpower_spent[message.id]
+            raise
+        trace.mark('send')
+        record_reroll(interaction, original, result, positions)
+        trace.finish()
+
+def result_view(user_id, result):
+    """View da mensagem de resultado: o botão de Força de Vontade, ou None se não há o que rerrolar"""
+    if not result.willpower_targets():
+        return None
+    view = discord.ui.View(timeout=None)
+    view.add_item(WillpowerRerollButton(user_id, result.difficulty, result.hunger, result.results))
+    # Como no painel, a view parada não fica guardada por mensagem
+    view.stop()
+    return view
+
+@cached_embed(maxsize=1200)
+def create_odds_embed(dice_count, difficulty, hunger):
+    """Cria o embed com as probabilidades exatas de uma parada"""
+    odds = probability_table().odds(dice_count, difficulty, hunger)
+
+    embed = discord.Embed(
+        title="📈 Chances da Rolagem - Vampiro V5",
+        color=0x8B0000
+    )
+
+    embed.add_field(
+        name="📊 Parâmetros",
+        value=f"**Dados:** {dice_count}\n**Dificuldade:** {difficulty}\n**Fome:** {hunger}",
+        inline=True
+    )
 
-    @discord.ui.button(label='Fome +', style=discord.ButtonStyle.green, row=2)
-    async def hunger_plus(self, interaction: discord.Interaction, button: discord.ui.Button):
-        if self.hunger < 5 and self.hunger < self.dice_count:
-            self.hunger += 1
-        await interaction.response.edit_message(embed=self.create_embed(), view=self)
+    embed.add_field(
+        name="🎯 Probabilidades",
+        value=(
+            f"✅ **Sucesso:** {odds.success:.2%}\n"
+            f"❌ **Falha:** {odds.failure:.2%}\n"
+            f"🩸 **Falha Bestial:** {odds.bestial_failure:.2%}\n"
+            f"🔥 **Sucesso Bestial:** {odds.bestial_success:.2%}"
+        ),
+        inline=True
+    )
 
-    # Botão principal para rolar
-    @discord.ui.button(label='🎲 ROLAR DADOS', style=discord.ButtonStyle.primary, row=3)
-    async def roll_dice(self, interaction: discord.Interaction, button: discord.ui.Button):
-        try:
-            result = roll_vampire_dice(self.dice_count, self.difficulty, self.hunger, self.title)
-            embed = create_result_embed(result)
-            await interaction.response.send_message(embed=embed)
-        except Exception as e:
-            await interaction.response.send_message(f"❌ Erro: {str(e)}", ephemeral=True)
+    # Distribuição dos sucessos (omite valores praticamente impossíveis)
+    peak = max(odds.distribution)
+    lines = []
+    for successes, probability in enumerate(odds.distribution):
+        if probability < 0.001:
+            continue
+        bar = "█" * max(1, round(10 * probability / peak))
+        lines.append(f"`{successes:>2}` {bar} {probability:.1%}")
 
-    # Botão para definir título
-    @discord.ui.button(label='📝 Título', style=discord.ButtonStyle.secondary, row=3)
-    async def set_title(self, interaction: discord.Interaction, button: discord.ui.Button):
-        modal = TitleModal(self)
-        await interaction.response.send_modal(modal)
+    embed.add_field(
+        name="✨ Distribuição de Sucessos",
+        value="\n".join(lines)[:1024],
+        inline=False
+    )
 
-    # Botão para abrir modal de entrada manual
-    @discord.ui.button(label='✏️ Entrada Manual', style=discord.ButtonStyle.secondary, row=4)
-    async def manual_input(self, interaction: discord.Interaction, button: discord.ui.Button):
-        modal = DiceRollModal()
-        await interaction.response.send_modal(modal)
+    embed.set_footer(text=f"Média de {odds.expected_successes:.2f} sucessos | Valores exatos, sem simulação")
+    return embed
 
-    async def on_timeout(self):
-        # Desabilitar todos os botões quando expirar
-        for item in self.children:
-            item.disabled = True
+def create_simulation_embed(summary, dice_count, difficulty, hunger):
+    """Cria o embed comparando a simulação com as probabilidades exatas"""
+    odds = probability_table().odds(dice_count, difficulty, hunger)
+    trials = summary.trials
+    simulated = [count / trials for count in summary.outcome_counts]
+    mean = sum(value * count for value, count in enumerate(summary.success_histogram)) / trials
 
-def create_result_embed(result):
-    """Cria o embed com os resultados da rolagem"""
-    
-    # Título principal do embed
-    main_title = "🎲 Resultado da Rolagem - Vampiro V5"
-    if result.title:
-        main_title = f"🎲 {result.title} - Vampiro V5"
-    
     embed = discord.Embed(
-        title=main_title,
+        title="🧪 Simulação de Rolagens - Vampiro V5",
         color=0x8B0000
     )
-    
-    # Adicionar informações da rolagem
+
     embed.add_field(
         name="📊 Parâmetros",
-        value=f"**Dados:** {result.dice_count}\n**Dificuldade:** {result.difficulty}\n**Fome:** {result.hunger}",
+        value=f"**Dados:** {dice_count}\n**Dificuldade:** {difficulty}\n**Fome:** {hunger}\n**Rolagens:** {trials:,}".replace(",", "."),
         inline=True
     )
-    
-    # Mostrar resultados dos dados
-    dice_display = format_dice_results(result)
+
     embed.add_field(
-        name="🎯 Resultados dos Dados",
-        value=dice_display,
-        inline=False
+        name="🎯 Simulado (exato)",
+        value=(
+            f"✅ **Sucesso:** {simulated[OUTCOME_SUCCESS]:.2%} ({odds.success:.2%})\n"
+            f"❌ **Falha:** {simulated[OUTCOME_FAILURE]:.2%} ({odds.failure:.2%})\n"
+            f"🩸 **Falha Bestial:** {simulated[OUTCOME_BESTIAL_FAILURE]:.2%} ({odds.bestial_failure:.2%})\n"
+            f"🔥 **Sucesso Bestial:** {simulated[OUTCOME_BESTIAL_SUCCESS]:.2%} ({odds.bestial_success:.2%})\n"
+            f"✨ **Média de sucessos:** {mean:.2f} ({odds.expected_successes:.2f})"
+        ),
+        inline=True
     )
-    
-    # Mostrar sucessos com detalhamento completo
-    success_text = f"**{result.successes}** de {result.difficulty} necessários\n"
-    
-    # Detalhamento dos sucessos
-    details = []
-    if result.regular_successes > 0:
-        details.append(f"{result.regular_successes} sucessos normais")
-    if result.critical_successes > 0:
-        details.append(f"{result.critical_successes} críticos (×2)")
-    if result.total_ones > 0:
-        details.append(f"{result.total_ones} falhas críticas")
-    
-    if details:
-        if result.total_ones > 0:
-            success_text += f"*({' + '.join(details[:-1])} - {details[-1]} = {result.raw_successes} - {result.total_ones})*"
+
+    embed.set_footer(text=f"⏱️ {trials:,} rolagens em {summary.elapsed * 1000:.0f} ms".replace(",", "."))
+    return embed
+
+def create_history_embed(rows, page, scope_text):
+    """Cria o embed com uma página do histórico de rolagens"""
+    embed = discord.Embed(
+        title="📜 Histórico de Rolagens - Vampiro V5",
+        description=scope_text,
+        color=0x8B0000
+    )
+
+    if not rows:
+        embed.add_field(name="Nenhuma rolagem encontrada", value="Role alguns dados com `/vamp` ou `/dados`!", inline=False)
+    else:
+        lines = []
+        for roll_id, created_at, user_id, dice_count, difficulty, hunger, title, dice, successes, outcome, rerolled in rows:
+            label = f" **{title}**" if title else ""
+            if rerolled is not None:
+                label += " 💪"
+            dice_text = " ".join(map(str, dice))
+            lines.append(
+                f"`#{roll_id}` <t:{int(created_at)}:R> <@{user_id}>{label}\n"
+                f"{OUTCOME_EMOJIS[outcome]} {successes}/{difficulty} · {dice_count} dados, fome {hunger} · `{dice_text}`"
+            )
+        embed.description = f"{scope_text}\n\n" + "\n".join(lines)
+
+    embed.set_footer(text=f"Página {page + 1}")
+    return embed
+
+def create_sheet_embed(user, sheet):
+    """Cria o embed de uma ficha de personagem, com os traços agrupados"""
+    embed = discord.Embed(
+        title=f"🧛 {sheet.name or user.display_name} - Vampiro V5",
+        color=0x8B0000
+    )
+    groups = {"💪 Atributos": [], "📚 Habilidades": [], "🔮 Disciplinas": []}
+    for key, (label, value) in sheet.traits.items():
+        if key in ATTRIBUTE_KEYS:
+            groups["💪 Atributos"].append((ATTRIBUTE_NAMES.index(label), label, value))
+        elif key in SKILL_KEYS:
+            groups["📚 Habilidades"].append((SKILL_NAMES.index(label), label, value))
         else:
-            success_text += f"*({' + '.join(details)} = {result.raw_successes})*"
-    
+            groups["🔮 Disciplinas"].append((0, label, value))
+    for name, traits in groups.items():
+        if traits:
+            traits.sort()
+            embed.add_field(
+                name=name,
+                value="\n".join(f"{label}: {'●' * value}{'○' * (5 - value)}" for _, label, value in traits),
+                inline=True
+            )
+    embed.add_field(name="🩸 Fome", value=f"**{sheet.hunger}**", inline=False)
+    embed.set_footer(text="💡 Role com /vamp parada:Destreza+Briga")
+    return embed
+
+def create_stats_embed(user, summary):
+    """Cria o embed com as estatísticas acumuladas de um jogador"""
+    embed = discord.Embed(
+        title=f"📊 Estatísticas de {user.display_name} - Vampiro V5",
+        color=0x8B0000
+    )
+
+    if summary is None:
+        embed.description = "Nenhuma rolagem registrada ainda. Role alguns dados com `/vamp` ou `/dados`!"
+        return embed
+
     embed.add_field(
-        name="✨ Sucessos",
-        value=success_text,
+        name="🎲 Rolagens",
+        value=f"**Total:** {summary.rolls}\n**Taxa de sucesso:** {summary.success_rate:.1%}",
         inline=True
     )
-    
-    # Determinar resultado final
-    if result.bestial_failure:
-        embed.add_field(
-            name="🩸 FALHA BESTIAL",
-            value="Falhou no teste e rolou 1 nos dados de fome!",
-            inline=False
-        )
-        embed.color = 0x800000
-    elif result.bestial_success:
-        embed.add_field(
-            name="🔥 SUCESSO BESTIAL",
-            value="Falhou no teste mas rolou 10 nos dados de fome!",
-            inline=False
-        )
-        embed.color = 0xFF4500
-    elif result.success:
-        embed.add_field(
-            name="✅ SUCESSO",
-            value="Teste bem-sucedido!",
-            inline=False
-        )
-        embed.color = 0x228B22
+
+    embed.add_field(
+        name="🩸 Fome",
+        value=f"**Falhas bestiais:** {summary.bestial_failures}\n**Sucessos bestiais:** {summary.bestial_successes}",
+        inline=True
+    )
+
+    embed.add_field(
+        name="🍀 Sorte",
+        value=(
+            f"**Sucessos por dado:** {summary.successes_per_die:.2f} (esperado {summary.expected_per_die:.2f})\n"
+            f"**Acima do esperado:** {summary.luck_rate:.1%} das rolagens\n"
+            f"**Saldo:** {summary.luck_balance:+.1f} sucessos em relação à média"
+        ),
+        inline=False
+    )
+
+    return embed
+
+def create_metrics_embed(metrics, queue):
+    """Cria o embed com os percentis de latência por comando e a situação da fila de envio"""
+    embed = discord.Embed(
+        title="⏱️ Métricas de Latência",
+        color=0x8B0000
+    )
+
+    lines = []
+    for (command, phase), histogram in metrics.histograms():
+        p50, p95, p99 = (histogram.percentile(quantile) / 1000 for quantile in metrics.QUANTILES)
+        lines.append(f"{command:<22} {phase:<6} {histogram.count:>7} {p50:>8.1f} {p95:>8.1f} {p99:>8.1f}")
+
+    if lines:
+        header = f"{'comando':<22} {'etapa':<6} {'n':>7} {'p50':>8} {'p95':>8} {'p99':>8}"
+        # Descrição do embed tem limite de 4096 caracteres
+        embed.description = f"```\n{header}\n" + "\n".join(lines)[:3900] + "\n```"
     else:
-        embed.add_field(
-            name="❌ FALHA",
-            value="Não atingiu o número necessário de sucessos",
-            inline=False
-        )
-        embed.color = 0x696969
-    
-    # Adicionar legenda
-    legend = "🩸 = Dado de Fome | ✅ = Sucesso | ❌ = Falha | 💀 = Falha Crítica | ⭐ = Sucesso Crítico (2 sucessos) | 🔥 = Potencial Bestial"
-    embed.set_footer(text=legend)
-    
+        embed.description = "Nenhuma interação registrada ainda."
+
+    depth = " · ".join(f"{name}: {count}" for name, count in queue.depth().items())
+    embed.add_field(
+        name="📤 Fila de Envio",
+        value=f"Esperando: {depth}\nEm andamento: {queue.in_flight}",
+        inline=False
+    )
+
+    embed.set_footer(text="Tempos em milissegundos desde o início do processo")
     return embed
 
+# View para navegar pelo histórico
+class HistoryPageView(discord.ui.View):
+    def __init__(self, guild_id, channel_id, user_id, scope_text, page=0, has_next=False):
+        super().__init__(timeout=120)
+        self.guild_id = guild_id
+        self.channel_id = channel_id
+        self.user_id = user_id
+        self.scope_text = scope_text
+        self.page = page
+        self.previous_page.disabled = page == 0
+        self.next_page.disabled = not has_next
+
+    async def show_page(self, interaction, page):
+        rows, has_next = await roll_history.page(self.guild_id, self.channel_id, self.user_id, page)
+        self.page = page
+        self.previous_page.disabled = page == 0
+        self.next_page.disabled = not has_next
+        await interaction.response.edit_message(embed=create_history_embed(rows, page, self.scope_text), view=self)
+
+    @discord.ui.button(label='◀', style=discord.ButtonStyle.secondary)
+    async def previous_page(self, interaction: discord.Interaction, button: discord.ui.Button):
+        await self.show_page(interaction, max(0, self.page - 1))
+
+    @discord.ui.button(label='▶', style=discord.ButtonStyle.secondary)
+    async def next_page(self, interaction: discord.Interaction, button: discord.ui.Button):
+        await self.show_page(interaction, self.page + 1)
+
+class GroupResultView(discord.ui.View):
+    def __init__(self, entries, title=None):
+        super().__init__(timeout=120)
+        self.entries = entries
+        self.title = title
+        self.page = 0
+        self.pages = (len(entries) + GROUP_PAGE_SIZE - 1) // GROUP_PAGE_SIZE
+        self.refresh_buttons()
+        # Uma página só: nada para navegar, a view não precisa ficar registrada
+        if self.pages <= 1:
+            self.clear_items()
+            self.stop()
+
+    def refresh_buttons(self):
+        self.previous_page.disabled = self.page == 0
+        self.next_page.disabled = self.page >= self.pages - 1
+
+    def create_embed(self):
+        return create_group_result_embed(self.entries, self.page, self.title)
+
+    async def show_page(self, interaction, page):
+        self.page = page
+        self.refresh_buttons()
+        await interaction.response.edit_message(embed=self.create_embed(), view=self)
+
+    @discord.ui.button(label='◀', style=discord.ButtonStyle.secondary)
+    async def previous_page(self, interaction: discord.Interaction, button: discord.ui.Button):
+        await self.show_page(interaction, max(0, self.page - 1))
+
+    @discord.ui.button(label='▶', style=discord.ButtonStyle.secondary)
+    async def next_page(self, interaction: discord.Interaction, button: discord.ui.Button):
+        await self.show_page(interaction, min(self.pages - 1, self.page + 1))
+
+# Tarefas em segundo plano do bot (o asyncio só guarda referências fracas das tarefas)
+background_tasks = set()
+
+def start_background(coro):
+    task = asyncio.get_running_loop().create_task(coro)
+    background_tasks.add(task)
+    task.add_done_callback(background_tasks.discard)
+    return task
+
+async def warm_probability_table():
+    """Monta a tabela de probabilidades logo depois do bot ficar pronto, fora da primeira rolagem"""
+    await bot.wait_until_ready()
+    await asyncio.to_thread(probability_table)
+
+@bot.event
+async def setup_hook():
+    # Botões com estado no custom_id (painéis continuam funcionando após reiniciar)
+    bot.add_dynamic_items(DiceConfigButton, WillpowerRerollButton)
+
+    # Tarefas em segundo plano que precisam do loop do bot
+    await roll_history.start()
+    latency_metrics.start(METRICS_PATH, METRICS_INTERVAL)
+    await player_stats.start()
+    await character_sheets.start()
+
+    # Sincroniza uma vez por processo, fora do on_ready (que roda de novo a cada reconexão).
+    # Só com login (application_id definido) e, com vários processos, só no dono do shard 0.
+    if bot.application_id is not None and owns_guild(None):
+        start_background(sync_command_tree(bot.tree, bot.application_id, TREE_HASH_PATH))
+    if HEALTH_DIR:
+        start_background(report_shard_health(HEALTH_DIR, HEALTH_INTERVAL))
+    # A tabela é preguiçosa para não atrasar a inicialização, mas toda rolagem a usa (estatísticas)
+    if bot.application_id is not None:
+        start_background(warm_probability_table())
+
+    # O launcher e os gerenciadores de serviço param o bot com SIGTERM, que o discord.py não trata:
+    # sem isto o processo morre sem passar pelo bot.close nem pelos atexit e perde o que não foi gravado
+    try:
+        asyncio.get_running_loop().add_signal_handler(signal.SIGTERM, lambda: start_background(bot.close()))
+    except NotImplementedError:
+        pass  # Windows: só Ctrl+C
+
+async def flush_stores():
+    """Grava histórico, estatísticas e fichas pendentes pelos executores, sem travar o loop"""
+    for store in (roll_history, player_stats, character_sheets):
+        try:
+            await store.flush()
+        except sqlite3.Error as e:
+            print(f"Falha ao salvar {store.LABEL} ao encerrar: {e}")
+
+close_client = bot.close
+
+async def close_bot():
+    """bot.close que antes grava o que está pendente (Ctrl+C, SIGTERM ou encerramento normal)"""
+    await flush_stores()
+    await close_client()
+
+bot.close = close_bot
+
+ready_reported = False
+
 @bot.event
 async def on_ready():
+    global ready_reported
+    # on_ready também roda após reconexões; o resumo de inicialização sai uma vez só
+    if ready_reported:
+        print(f'{bot.user} reconectado')
+        return
+    ready_reported = True
+
     print(f'{bot.user} está conectado e pronto!')
-    print(f'Comandos disponíveis: /vamp, /dados, !vamp, !ajuda_vamp')
-    
-    # Sincronizar comandos slash
-    try:
-        synced = await bot.tree.sync()
-        print(f"Sincronizados {len(synced)} comandos slash")
-    except Exception as e:
-        print(f"Falha ao sincronizar comandos: {e}")
+    print(f'Comandos disponíveis: /vamp, /dados, /grupo, /despertar, /ficha, /chance, /simular, /historico, /verificar, /estatisticas, /exportar, !vamp, !ajuda_vamp')
+    if isinstance(bot, commands.AutoShardedBot):
+        print(f'Shards deste processo: {sorted(bot.shards)} de {bot.shard_count}')
+    ready_at = time.perf_counter()
+    print(
+        f"⏱️ Pronto em {ready_at - STARTED_AT:.2f}s "
+        f"(importação {IMPORTED_AT - STARTED_AT:.2f}s, conexão {ready_at - IMPORTED_AT:.2f}s)"
+    )
 
 # Comando slash principal com interface interativa
 @bot.tree.command(name="dados", description="Abrir interface interativa para rolar dados de Vampiro V5")
 async def interactive_dice(interaction: discord.Interaction):
     view = DiceConfigView()
     embed = view.create_embed()
-    await interaction.response.send_message(embed=embed, view=view)
+    await outbound.respond(interaction, embed=embed, view=view)
+
+# Comando slash de rolagem em grupo
+@bot.tree.command(name="grupo", description="Abrir um painel para rolar as paradas de vários jogadores de uma vez")
+@app_commands.describe(titulo="Título da rolagem em grupo (opcional)")
+async def group_dice(interaction: discord.Interaction, titulo: str = None):
+    title = titulo.strip()[:50] if titulo and titulo.strip() else None
+    view = DiceConfigView(title=title, group={})
+    embed = view.create_embed()
+    await outbound.respond(interaction, embed=embed, view=view)
 
 # Comando slash rápido
 @bot.tree.command(name="vamp", description="Rolar dados de Vampiro V5 rapidamente")
 @app_commands.describe(
-    dados="Número de dados para rolar (1-20)",
     dificuldade="Número de sucessos necessários (1-10)",
-    fome="Nível de fome (0-5)",
-    titulo="Título personalizado para a rolagem (opcional)"
+    dados="Número de dados para rolar (1-20)",
+    fome="Nível de fome (0-5; padrão: a da sua ficha)",
+    titulo="Título personalizado para a rolagem (opcional)",
+    parada="Traços da sua /ficha no lugar dos dados, ex.: Destreza+Briga"
 )
-async def slash_vampire_roll(interaction: discord.Interaction, dados: int, dificuldade: int, fome: int = 0, titulo: str = None):
+async def slash_vampire_roll(interaction: discord.Interaction, dificuldade: int, dados: int = None, fome: int = None, titulo: str = None, parada: str = None):
     try:
-        # Validações
-        if dados <= 0 or dados > 20:
-            await interaction.response.send_message("❌ Número de dados deve estar entre 1 e 20", ephemeral=True)
+        # A ficha só é consultada quando fornece a parada ou a fome
+        sheet = None
+        if parada or fome is None:
+            sheet = await character_sheets.get(interaction.guild_id, interaction.user.id)
+        if parada:
+            if sheet is None:
+                await outbound.respond(interaction, "❌ Você ainda não tem ficha: use `/ficha definir`", ephemeral=True)
+                return
+            try:
+                dados, pool_label = sheet.resolve_pool(parada)
+            except ValueError as e:
+                await outbound.respond(interaction, f"❌ {str(e)}", ephemeral=True)
+                return
+            titulo = titulo or pool_label
+        elif dados is None:
+            await outbound.respond(interaction, "❌ Informe `dados` ou uma `parada` da sua ficha", ephemeral=True)
             return
+        if fome is None:
+            # Com fome maior que a parada, todos os dados são de fome
+            fome = min(sheet.hunger, max(dados, 0)) if sheet is not None else 0
         
-        if dificuldade <= 0 or dificuldade > 10:
-            await interaction.response.send_message("❌ Dificuldade deve estar entre 1 e 10", ephemeral=True)
-            return
-            
-        if fome < 0 or fome > 5:
-            await interaction.response.send_message("❌ Nível de fome deve estar entre 0 e 5", ephemeral=True)
-            return
-            
-        if fome > dados:
-            await interaction.response.send_message("❌ Nível de fome não pode ser maior que o número de dados", ephemeral=True)
+        # Validações
+        error = validate_roll(dados, dificuldade, fome)
+        if error:
+            await outbound.respond(interaction, f"❌ {error}", ephemeral=True)
             return
         
         # Processar título
         title = titulo.strip() if titulo and titulo.strip() else None
         
         # Rolar os dados
-        result = roll_vampire_dice(dados, dificuldade, fome, title)
+        trace = latency_metrics.trace('vamp')
+        result = roll_vampire_dice(dados, dificuldade, fome, title, rng_scope(interaction))
+        record_roll(interaction, result)
+        trace.mark('roll')
         embed = create_result_embed(result)
-        await interaction.response.send_message(embed=embed)
+        trace.mark('render')
+        await outbound.respond(interaction, embed=embed, view=result_view(interaction.user.id, result))
+        trace.mark('send')
+        trace.finish()
         
     except Exception as e:
-        await interaction.response.send_message(f"❌ Erro: {str(e)}", ephemeral=True)
+        await outbound.respond(interaction, f"❌ Erro: {str(e)}", ephemeral=True)
 
-# Manter comandos antigos para compatibilidade
-@bot.command(name='vamp', aliases=['vampiro', 'v5'])
-async def roll_vampire(ctx, dados: int, dificuldade: int, fome: int = 0, *, titulo: str = None):
-    """Comando de texto tradicional"""
-    try:
-        if dados <= 0 or dados > 20:
-            await ctx.send("❌ Número de dados deve estar entre 1 e 20")
-            return
-        
-        if dificuldade <= 0 or dificuldade > 10:
-            await ctx.send("❌ Dificuldade deve estar entre 1 e 10")
-            return
-            
-        if fome < 0 or fome > 5:
-            await ctx.send("❌ Nível de fome deve estar entre 0 e 5")
+# Comando slash de Teste de Despertar
+@bot.tree.command(name="despertar", description="Fazer Testes de Despertar (Rouse Check) de Vampiro V5")
+@app_commands.describe(
+    fome="Nível de fome atual (0-5)",
+    testes="Quantidade de testes (1-5)"
+)
+async def slash_rouse_check(interaction: discord.Interaction, fome: int = None, testes: int = 1):
+    # Sem fome informada, usa (e depois atualiza) a fome da ficha
+    sheet = await character_sheets.get(interaction.guild_id, interaction.user.id) if fome is None else None
+    if fome is None:
+        fome = sheet.hunger if sheet is not None else 0
+    if fome < 0 or fome > 5:
+        await outbound.respond(interaction, "❌ Nível de fome deve estar entre 0 e 5", ephemeral=True)
+        return
+    if testes < 1 or testes > 5:
+        await outbound.respond(interaction, "❌ Quantidade de testes deve estar entre 1 e 5", ephemeral=True)
+        return
+    check = roll_rouse_checks(fome, testes, rng_scope(interaction))
+    if sheet is not None and check.hunger_after != sheet.hunger:
+        sheet.hunger = check.hunger_after
+        character_sheets.save(interaction.guild_id, interaction.user.id, sheet)
+    await outbound.respond(interaction, embed=create_rouse_embed(check))
+
+# Comandos slash de fichas de personagem
+sheet_commands = app_commands.Group(name="ficha", description="Ficha do seu personagem (traços e fome)")
+
+@sheet_commands.command(name="definir", description="Criar ou alterar traços, nome e fome da sua ficha")
+@app_commands.describe(
+    tracos="Traços e valores, ex.: Força 2, Destreza 3, Briga 2, Auspícios 1 (0 remove o traço)",
+    nome="Nome do personagem",
+    fome="Fome atual (0-5)"
+)
+async def sheet_set(interaction: discord.Interaction, tracos: str = None, nome: str = None, fome: int = None):
+    if fome is not None and (fome < 0 or fome > 5):
+        await outbound.respond(interaction, "❌ Nível de fome deve estar entre 0 e 5", ephemeral=True)
+        return
+    sheet = await character_sheets.get(interaction.guild_id, interaction.user.id) or CharacterSheet()
+    if tracos:
+        try:
+            sheet.set_traits(tracos)
+        except ValueError as e:
+            await outbound.respond(interaction, f"❌ {str(e)}", ephemeral=True)
             return
-            
-        if fome > dados:
-            await ctx.send("❌ Nível de fome não pode ser maior que o número de dados")
+    if nome and nome.strip():
+        sheet.name = nome.strip()[:50]
+    if fome is not None:
+        sheet.hunger = fome
+    character_sheets.save(interaction.guild_id, interaction.user.id, sheet)
+    await outbound.respond(interaction, embed=create_sheet_embed(interaction.user, sheet), ephemeral=True)
+
+@sheet_commands.command(name="ver", description="Ver a ficha de um personagem")
+@app_commands.describe(jogador="Dono da ficha (padrão: você)")
+async def sheet_show(interaction: discord.Interaction, jogador: discord.User = None):
+    user = jogador or interaction.user
+    sheet = await character_sheets.get(interaction.guild_id, user.id)
+    if sheet is None:
+        await outbound.respond(interaction, f"❌ {user.display_name} ainda não tem ficha", ephemeral=True)
+        return
+    await outbound.respond(interaction, embed=create_sheet_embed(user, sheet))
+
+bot.tree.add_command(sheet_commands)
+
+# Comando slash de probabilidades
+@bot.tree.command(name="chance", description="Calcular as chances exatas de uma rolagem de Vampiro V5")
+@app_commands.describe(
+    dados="Número de dados para rolar (1-20)",
+    dificuldade="Número de sucessos necessários (1-10)",
+    fome="Nível de fome (0-5)"
+)
+async def slash_vampire_odds(interaction: discord.Interaction, dados: int, dificuldade: int, fome: int = 0):
+    error = validate_roll(dados, dificuldade, fome)
+    if error:
+        await outbound.respond(interaction, f"❌ {error}", ephemeral=True)
+        return
+    await outbound.respond(interaction, embed=create_odds_embed(dados, dificuldade, fome))
+
+# Comando slash de simulação
+@bot.tree.command(name="simular", description="Simular muitas rolagens de Vampiro V5 de uma vez")
+@app_commands.describe(
+    dados="Número de dados para rolar (1-20)",
+    dificuldade="Número de sucessos necessários (1-10)",
+    fome="Nível de fome (0-5)",
+    rolagens="Quantidade de rolagens simuladas (1-1000000)"
+)
+async def slash_vampire_simulation(interaction: discord.Interaction, dados: int, dificuldade: int, fome: int = 0, rolagens: int = 100000):
+    if rolagens <= 0 or rolagens > 1000000:
+        await outbound.respond(interaction, "❌ Número de rolagens deve estar entre 1 e 1.000.000", ephemeral=True)
+        return
+
+    error = validate_roll(dados, dificuldade, fome)
+    if error:
+        await outbound.respond(interaction, f"❌ {error}", ephemeral=True)
+        return
+
+    total_dice = rolagens * dados
+    # Verifica a capacidade antes de ocupar um processo; simulações pequenas rodam no loop e nunca esperam
+    if total_dice > INLINE_DICE_LIMIT:
+        try:
+            dice_pool.check(interaction.guild_id)
+        except DiceWorkBusy as e:
+            await outbound.respond(interaction, str(e), ephemeral=True)
             return
-        
-        # Processar título
-        title = titulo.strip() if titulo and titulo.strip() else None
-        
-        result = roll_vampire_dice(dados, dificuldade, fome, title)
-        embed = create_result_embed(result)
-        await ctx.send(embed=embed)
-        
+
+    await outbound.defer(interaction, thinking=True)
+    try:
+        summary = await dice_pool.run(
+            interaction.guild_id, total_dice,
+            simulate_vampire_dice, rolagens, dados, dificuldade, fome,
+        )
+    except DiceWorkBusy as e:
+        await outbound.followup(interaction, str(e), ephemeral=True)
+        return
+    except Exception as e:
+        # Processo do pool caiu (BrokenProcessPool) ou erro na simulação: sem isso a resposta fica em "pensando..."
+        print(f"Falha na simulação: {e!r}")
+        await outbound.followup(interaction, "❌ A simulação falhou, tente novamente", ephemeral=True)
+        return
+    embed = create_simulation_embed(summary, dados, dificuldade, fome)
+    await outbound.followup(interaction, embed=embed)
+
+# Comando slash de histórico
+@bot.tree.command(name="historico", description="Ver as últimas rolagens de Vampiro V5")
+@app_commands.describe(
+    jogador="Mostrar apenas as rolagens deste jogador (opcional)",
+    canal="Canal das rolagens (padrão: este canal)",
+    pagina="Página do histórico (1 = mais recentes)"
+)
+async def slash_roll_history(interaction: discord.Interaction, jogador: discord.User = None, canal: discord.TextChannel = None, pagina: int = 1):
+    if pagina <= 0:
+        await outbound.respond(interaction, "❌ Página deve ser maior que 0", ephemeral=True)
+        return
+
+    # Fora de servidores, só as próprias rolagens
+    if interaction.guild_id is None:
+        jogador = interaction.user
+        channel_id = None
+    elif canal is None:
+        # Um canal por vez: rolagens de canais privados ou da staff não vazam para outros canais
+        channel_id = interaction.channel_id
+    elif not canal.permissions_for(interaction.user).view_channel:
+        await outbound.respond(interaction, "❌ Você não tem acesso a esse canal", ephemeral=True)
+        return
+    else:
+        channel_id = canal.id
+
+    user_id = jogador.id if jogador else None
+
+    scope = []
+    if jogador:
+        scope.append(f"Jogador: {jogador.mention}")
+    if channel_id is not None:
+        scope.append(f"Canal: <#{channel_id}>")
+    scope_text = " · ".join(scope)
+
+    page = pagina - 1
+    rows, has_next = await roll_history.page(interaction.guild_id, channel_id, user_id, page)
+    view = HistoryPageView(interaction.guild_id, channel_id, user_id, scope_text, page, has_next)
+    await outbound.respond(interaction, embed=create_history_embed(rows, page, scope_text), view=view)
+
+# Comando slash de verificação de rolagens
+@bot.tree.command(name="verificar", description="Conferir se uma rolagem do histórico bate com a sequência de dados")
+@app_commands.describe(numero="Número da rolagem no /historico (ex.: 42 para #42)")
+async def slash_verify_roll(interaction: discord.Interaction, numero: int):
+    row = await roll_history.get(numero)
+    # Rolagens de outros servidores não são expostas; na DM (sem servidor) só as do próprio jogador
+    if row is None or row[2] != interaction.guild_id or (
+        interaction.guild_id is None and row[3] != interaction.user.id
+    ):
+        await outbound.respond(interaction, f"❌ Rolagem #{numero} não encontrada", ephemeral=True)
+        return
+
+    roll_id, created_at, guild_id, user_id, dice_count, difficulty, hunger, title, dice, stream_id, position, rerolled = row
+    if stream_id is None:
+        await outbound.respond(interaction, 
+            f"⚠️ A rolagem #{roll_id} não pode ser refeita: foi feita com dados do sistema (modo csprng) "
+            f"ou antes das sequências auditáveis.",
+            ephemeral=True,
+        )
+        return
+
+    # Na Força de Vontade, a sequência registrada gerou só os dados rerrolados
+    drawn = dice if rerolled is None else bytes(dice[index] for index in rerolled)
+    replayed = await asyncio.to_thread(dice_rng.replay, stream_id, position, len(drawn))
+    label = f" **{title}**" if title else ""
+    details = (
+        f"`#{roll_id}` <t:{int(created_at)}:R> <@{user_id}>{label}\n"
+        f"Sequência `{stream_id}`, posição {position} · {dice_count} dados, fome {hunger}, dificuldade {difficulty}\n"
+        f"Registrado: `{' '.join(map(str, dice))}`"
+    )
+    if rerolled is not None:
+        details += (
+            f"\n💪 Força de Vontade: dados {', '.join(str(index + 1) for index in rerolled)} rerrolados "
+            f"(`{' '.join(map(str, drawn))}`)"
+        )
+    if replayed == drawn:
+        embed = discord.Embed(title="✅ Rolagem verificada", description=details, color=0x228B22)
+    else:
+        embed = discord.Embed(
+            title="❌ Rolagem não confere",
+            description=f"{details}\nRefeito: `{' '.join(map(str, replayed))}`",
+            color=0x8B0000,
+        )
+    await outbound.respond(interaction, embed=embed)
+
+# Comando slash de estatísticas
+@bot.tree.command(name="estatisticas", description="Ver as estatísticas de rolagens de um jogador")
+@app_commands.describe(jogador="Jogador para consultar (padrão: você)")
+async def slash_player_stats(interaction: discord.Interaction, jogador: discord.User = None):
+    user = jogador or interaction.user
+    summary = player_stats.summary(interaction.guild_id, user.id)
+    await outbound.respond(interaction, embed=create_stats_embed(user, summary))
+
+# Exportações em andamento (uma por servidor)
+exports_running = set()
+
+# Comando slash de exportação do histórico (apenas quem gerencia o servidor)
+@bot.tree.command(name="exportar", description="Exportar o histórico de rolagens do servidor em um arquivo .npz")
+@app_commands.describe(
+    jogador="Exportar apenas as rolagens deste jogador (opcional)",
+    dias="Exportar apenas os últimos N dias (padrão: todo o histórico)"
+)
+@app_commands.default_permissions(manage_guild=True)
+async def slash_export_history(interaction: discord.Interaction, jogador: discord.User = None, dias: int = None):
+    if dias is not None and dias <= 0:
+        await outbound.respond(interaction, "❌ Dias deve ser maior que 0", ephemeral=True)
+        return
+
+    # Fora de servidores, só as próprias rolagens
+    if interaction.guild_id is None:
+        jogador = interaction.user
+
+    key = interaction.guild_id or interaction.user.id
+    if key in exports_running:
+        await outbound.respond(interaction, "⏳ Já existe uma exportação em andamento aqui, aguarde ela terminar", ephemeral=True)
+        return
+
+    path = None
+    try:
+        exports_running.add(key)
+        await outbound.defer(interaction, thinking=True)
+        try:
+            fd, path = tempfile.mkstemp(suffix='.npz')
+            os.close(fd)
+            await send_history_export(interaction, path, jogador, dias)
+        except Exception as e:
+            # Sem resposta a interação ficaria em "pensando..." para sempre
+            print(f"Falha ao exportar histórico: {e!r}")
+            await outbound.followup(interaction, "❌ A exportação falhou, tente novamente")
+    finally:
+        exports_running.discard(key)
+        if path is not None:
+            os.remove(path)
+
+async def send_history_export(interaction, path, jogador, dias):
+    """Grava a exportação em `path` e envia como anexo (ou explica por que não deu)"""
+    since = time.time() - dias * 86400 if dias else None
+    total = await roll_history.export(path, interaction.guild_id, jogador.id if jogador else None, since)
+    if total == 0:
+        await outbound.followup(interaction, "📭 Nenhuma rolagem para exportar")
+        return
+
+    size = os.path.getsize(path)
+    limit = interaction.guild.filesize_limit if interaction.guild else discord.utils.DEFAULT_FILE_SIZE_LIMIT_BYTES
+    if size > limit:
+        await outbound.followup(
+            interaction,
+            f"❌ O arquivo ficou com {size / 2**20:.1f} MB, acima do limite de {limit / 2**20:.0f} MB do servidor. "
+            f"Use `dias` ou `jogador` para exportar menos rolagens."
+        )
+        return
+
+    filename = f"rolagens-{interaction.guild_id or 'dm'}-{time.strftime('%Y%m%d')}.npz"
+    count = f"{total:,}".replace(",", ".")
+    await outbound.followup(
+        interaction,
+        f"📦 {count} rolagens exportadas ({size / 2**20:.1f} MB). "
+        f"Analise com `python fairness.py {filename}` ou `numpy.load`.",
+        file=discord.File(path, filename=filename),
+    )
+
+# Comando slash de métricas (apenas administradores)
+@bot.tree.command(name="metricas", description="Ver a latência das respostas do bot por comando")
+@app_commands.default_permissions(administrator=True)
+async def slash_latency_metrics(interaction: discord.Interaction):
+    await outbound.respond(interaction, embed=create_metrics_embed(latency_metrics, outbound), ephemeral=True)
+
+# Manter comandos antigos para compatibilidade
+@bot.command(name='vamp', aliases=['vampiro', 'v5', 'v'])
+async def roll_vampire(ctx, *, expressao: str):
+    """Comando de texto: uma ou várias paradas por mensagem (ex.: `!v 5/3 6/4h2`)"""
+    try:
+        specs = parse_roll_expression(expressao)
     except ValueError as e:
-        await ctx.send(f"❌ Erro: {str(e)}")
+        await outbound.send(ctx, f"❌ {str(e)}")
+        return
+    
+    try:
+        # Todas as paradas roladas em lote e respondidas em uma única mensagem
+        trace = latency_metrics.trace('!vamp')
+        results = roll_vampire_pools(specs, rng_scope(ctx))
+        for result in results:
+            record_roll(ctx, result)
+        trace.mark('roll')
+        embeds = [create_result_embed(result) for result in results]
+        # Força de Vontade só quando a mensagem tem uma única parada; sem botão (None), a
+        # resposta pode ser juntada com outras do mesmo canal
+        view = result_view(ctx.author.id, results[0]) if len(results) == 1 else None
+        trace.mark('render')
+        await outbound.send(ctx, embeds=embeds, view=view)
+        trace.mark('send')
+        trace.finish()
+        
     except Exception as e:
-        await ctx.send(f"❌ Erro inesperado: {str(e)}")
+        await outbound.send(ctx, f"❌ Erro inesperado: {str(e)}")
 
 @bot.command(name='dados_interativo', aliases=['di'])
 async def interactive_dice_command(ctx):
     """Comando de texto para abrir interface interativa"""
     view = DiceConfigView()
     embed = view.create_embed()
-    await ctx.send(embed=embed, view=view)
+    await outbound.send(ctx, embed=embed, view=view)
 
-@bot.command(name='ajuda_vamp', aliases=['help_vamp', 'vampiro_help'])
-async def vampire_help(ctx):
-    """Mostra ajuda detalhada sobre o sistema de dados de Vampiro"""
-    
+@cached_embed(maxsize=1)
+def help_embed():
+    """Embed de ajuda, montado no primeiro !ajuda_vamp e reaproveitado depois"""
     embed = discord.Embed(
         title="🧛 Ajuda - Sistema de Dados Vampiro: A Máscara 5ª Ed",
         description="Como usar o bot de dados para V5",
@@ -501,19 +3316,31 @@ async def vampire_help(ctx):
     
     embed.add_field(
         name="🎛️ Interface Interativa (NOVO!)",
-        value="`/dados` - Abre interface com botões\n`!dados_interativo` ou `!di` - Versão texto",
+        value="`/dados` - Abre interface com botões\n`/grupo [titulo]` - Painel em que cada jogador entra com sua parada; um clique rola todas\n`!dados_interativo` ou `!di` - Versão texto",
         inline=False
     )
     
     embed.add_field(
         name="⚡ Comandos Rápidos",
-        value="`/vamp <dados> <dificuldade> [fome] [titulo]` - Slash command\n`!vamp <dados> <dificuldade> [fome] [titulo]` - Comando texto\n\nExemplos:\n• `/vamp 5 3 titulo:Teste de Persuasão`\n• `!vamp 6 4 2 Ataque com Garras`",
+        value="`/vamp <dificuldade> <dados> [fome] [titulo]` - Slash command (sem `fome`, usa a da sua ficha)\n`/vamp <dificuldade> parada:Destreza+Briga` - Parada e fome tiradas da sua ficha\n`!vamp <dados> <dificuldade> [fome] [titulo]` - Comando texto\n`!v 7d h2 dif4 \"Título\"` - Forma curta\n`!v 5/3 6/4h2` - Várias paradas em uma mensagem (até 10)\n\nExemplos:\n• `/vamp dificuldade:3 dados:5 titulo:Teste de Persuasão`\n• `!vamp 6 4 2 Ataque com Garras`\n• `!v 5/3 \"Percepção\" 6/4h2 \"Garras\"`",
+        inline=False
+    )
+    
+    embed.add_field(
+        name="📈 Probabilidades",
+        value="`/chance <dados> <dificuldade> [fome]` - Chances exatas de sucesso, falha e resultados bestiais\n`/simular <dados> <dificuldade> [fome] [rolagens]` - Simula até 1.000.000 de rolagens",
+        inline=False
+    )
+    
+    embed.add_field(
+        name="📜 Fichas, Histórico e Estatísticas",
+        value="`/ficha definir [tracos] [nome] [fome]` - Cria ou altera sua ficha (ex.: `Força 2, Destreza 3, Briga 2`)\n`/ficha ver [jogador]` - Mostra uma ficha\n`/historico [jogador] [canal] [pagina]` - Últimas rolagens do canal (padrão: este canal)\n`/verificar <numero>` - Refaz a rolagem `#numero` do histórico a partir da semente e confere os dados\n`/estatisticas [jogador]` - Totais, taxa de sucesso e sorte do jogador\n`/exportar [jogador] [dias]` - Arquivo .npz com o histórico para análises (ex.: `fairness.py`)",
         inline=False
     )
     
     embed.add_field(
         name="🎯 Como Funciona",
-        value="• **Sucessos:** 6-9 = 1 sucesso, 10 = 2 sucessos\n• **Falhas Críticas:** Cada 1 reduz um sucesso da parada\n• **Teste:** Precisa atingir (sucessos totais - falhas críticas) ≥ dificuldade\n• **Fome:** Afeta os primeiros X dados rolados",
+        value="• **Sucessos:** 6-9 = 1 sucesso, 10 = 2 sucessos\n• **Falhas Críticas:** Cada 1 reduz um sucesso da parada\n• **Teste:** Precisa atingir (sucessos totais - falhas críticas) ≥ dificuldade\n• **Fome:** Afeta os primeiros X dados rolados\n• **Crítico:** Par de 10s num teste bem-sucedido; com um 10 de fome é um **crítico bagunçado**\n• **Força de Vontade:** 💪 rerrola até 3 dados normais (1s e falhas), uma vez por rolagem\n• **Despertar:** `/despertar [fome] [testes]` - 6 ou mais passa, senão a fome sobe",
         inline=False
     )
     
@@ -530,16 +3357,27 @@ async def vampire_help(ctx):
     )
     
     embed.set_footer(text="💡 Use /dados para a nova interface interativa!")
-    
-    await ctx.send(embed=embed)
+    return embed
+
+@bot.command(name='ajuda_vamp', aliases=['help_vamp', 'vampiro_help'])
+async def vampire_help(ctx):
+    """Mostra ajuda detalhada sobre o sistema de dados de Vampiro"""
+    guild_id = ctx.guild.id if ctx.guild else None
+    previous = response_cooldowns.recent(guild_id, ctx.channel.id, 'ajuda')
+    if previous is not None:
+        await outbound.send(ctx, f"📖 A ajuda foi enviada há pouco neste canal: {previous}")
+        return
+    message = await outbound.send(ctx, embed=help_embed())
+    response_cooldowns.remember(guild_id, ctx.channel.id, 'ajuda', message)
 
 # Tratamento de erros
 @roll_vampire.error
 async def roll_vampire_error(ctx, error):
     if isinstance(error, commands.MissingRequiredArgument):
-        await ctx.send("❌ Uso correto: `!vamp <dados> <dificuldade> [fome] [titulo]`\nOu use `/dados` para interface interativa!")
-    elif isinstance(error, commands.BadArgument):
-        await ctx.send("❌ Por favor use números válidos para os parâmetros")
+        await outbound.send(ctx, "❌ Uso correto: `!vamp <dados> <dificuldade> [fome] [titulo]` ou `!v 7d h2 dif4 \"Título\"`\nVárias paradas: `!v 5/3 6/4h2`\nOu use `/dados` para interface interativa!")
+
+# Fim da importação: o que vem depois até o on_ready é login e conexão ao gateway
+IMPORTED_AT = time.perf_counter()
 
 if __name__ == "__main__":
     print("🧛 Iniciando bot de Vampiro: A Máscara...")
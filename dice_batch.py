@@ -0,0 +1,128 @@
+"""Rolagem em lote e simulação de Monte Carlo, sem dependências do bot
+
+Fica fora do bot.py para o pool de processos do /simular: os processos só importam este
+módulo (funções puras sobre bytes), não o discord.py, o histórico nem as fichas.
+"""
+import random
+import time
+from collections import namedtuple
+
+# Cada dado ocupa um byte. Bytes 0-249 viram faces 1-10 (250 = 25 × 10) e 250-255 são
+# descartados para não viciar os dados.
+DIE_FACES = bytes((value % 10) + 1 if value < 250 else 0 for value in range(256))
+DIE_REJECTED = bytes(range(250, 256))
+
+def _face_table(mapping):
+    """Cria uma tabela de tradução face -> valor (bytes fora de 1-10 viram 0)"""
+    return bytes(mapping(face) if 1 <= face <= 10 else 0 for face in range(256))
+
+# Pontuação por dado = saldo de sucessos + 1: 1 -> 0, 2-5 -> 1, 6-9 -> 2, 10 -> 3
+SCORE_TABLE = _face_table(lambda face: 0 if face == 1 else 3 if face == 10 else 2 if face >= 6 else 1)
+ONE_TABLE = _face_table(lambda face: int(face == 1))
+TEN_TABLE = _face_table(lambda face: int(face == 10))
+NONZERO_TABLE = bytes(int(value > 0) for value in range(256))
+
+# Resultados finais (mesma precedência de create_result_embed)
+OUTCOME_FAILURE = 0
+OUTCOME_SUCCESS = 1
+OUTCOME_BESTIAL_FAILURE = 2
+OUTCOME_BESTIAL_SUCCESS = 3
+
+# Código por parada: bit 0 = sucesso, bit 1 = 1 na fome, bit 2 = 10 na fome
+OUTCOME_TABLE = bytes(
+    OUTCOME_SUCCESS if code & 1 else
+    OUTCOME_BESTIAL_FAILURE if code & 2 else
+    OUTCOME_BESTIAL_SUCCESS if code & 4 else
+    OUTCOME_FAILURE
+    for code in range(256)
+)
+
+def roll_dice_bytes(count):
+    """Rola vários dados de 10 faces de uma vez, um byte por dado"""
+    dice = b''
+    while len(dice) < count:
+        missing = count - len(dice)
+        dice += random.randbytes(missing + missing // 32 + 8).translate(DIE_FACES, DIE_REJECTED)
+    return dice[:count]
+
+def _lane_sum(columns, table):
+    """Soma colunas byte a byte usando um inteiro grande como vetor (cada byte é uma faixa)"""
+    total = 0
+    for column in columns:
+        total += int.from_bytes(column.translate(table), 'little')
+    return total
+
+class VampireDiceBatch:
+    """Várias paradas iguais roladas de uma vez em uma matriz de bytes (uma linha por parada)"""
+
+    def __init__(self, pools, dice_count, difficulty, hunger, dice=None):
+        self.pools = pools
+        self.dice_count = dice_count
+        self.difficulty = difficulty
+        self.hunger = hunger
+        self.dice = dice if dice is not None else roll_dice_bytes(pools * dice_count)
+
+        # Coluna j = j-ésimo dado de todas as paradas
+        columns = [self.dice[j::dice_count] for j in range(dice_count)]
+        hunger_columns = columns[:hunger]
+
+        # Pontuação máxima por faixa: 3 × 20 = 60, cabe em um byte sem transbordar
+        scores = _lane_sum(columns, SCORE_TABLE).to_bytes(pools, 'little')
+
+        # Sucessos finais = max(0, pontuação - dados)
+        net_table = bytes(min(255, max(0, value - dice_count)) for value in range(256))
+        self.successes = scores.translate(net_table)
+        self.ones = _lane_sum(columns, ONE_TABLE).to_bytes(pools, 'little')
+        self.criticals = _lane_sum(columns, TEN_TABLE).to_bytes(pools, 'little')
+
+        # Flags por parada combinadas em um código de 3 bits
+        threshold = difficulty + dice_count
+        success_table = bytes(int(value >= threshold) for value in range(256))
+        codes = int.from_bytes(scores.translate(success_table), 'little')
+        if hunger > 0:
+            hunger_ones = _lane_sum(hunger_columns, ONE_TABLE).to_bytes(pools, 'little')
+            hunger_tens = _lane_sum(hunger_columns, TEN_TABLE).to_bytes(pools, 'little')
+            codes += int.from_bytes(hunger_ones.translate(NONZERO_TABLE), 'little') << 1
+            codes += int.from_bytes(hunger_tens.translate(NONZERO_TABLE), 'little') << 2
+        self.outcomes = codes.to_bytes(pools, 'little').translate(OUTCOME_TABLE)
+
+    def outcome_counts(self):
+        """Quantidade de paradas em cada resultado (indexado por OUTCOME_*)"""
+        return tuple(self.outcomes.count(outcome) for outcome in range(4))
+
+    def success_histogram(self):
+        """Quantidade de paradas para cada número de sucessos (0 a 2 × dados)"""
+        return tuple(self.successes.count(value) for value in range(2 * self.dice_count + 1))
+
+def roll_vampire_dice_batch(pools, dice_count, difficulty, hunger):
+    """Rola várias paradas iguais de uma vez"""
+    if pools <= 0:
+        raise ValueError("Número de rolagens deve ser maior que 0")
+    if dice_count <= 0 or dice_count > 20:
+        raise ValueError("Número de dados deve estar entre 1 e 20")
+    if difficulty <= 0:
+        raise ValueError("Dificuldade deve ser maior que 0")
+    if hunger < 0 or hunger > 5:
+        raise ValueError("Nível de fome deve estar entre 0 e 5")
+    if hunger > dice_count:
+        raise ValueError("Nível de fome não pode ser maior que o número de dados")
+    return VampireDiceBatch(pools, dice_count, difficulty, hunger)
+
+SimulationSummary = namedtuple('SimulationSummary', 'trials outcome_counts success_histogram elapsed')
+
+def simulate_vampire_dice(trials, dice_count, difficulty, hunger, chunk_size=65536):
+    """Simulação de Monte Carlo em blocos, sem criar um resultado por rolagem"""
+    start = time.perf_counter()
+    outcome_counts = [0] * 4
+    histogram = [0] * (2 * dice_count + 1)
+
+    remaining = trials
+    while remaining > 0:
+        batch = roll_vampire_dice_batch(min(chunk_size, remaining), dice_count, difficulty, hunger)
+        for outcome, count in enumerate(batch.outcome_counts()):
+            outcome_counts[outcome] += count
+        for value, count in enumerate(batch.success_histogram()):
+            histogram[value] += count
+        remaining -= batch.pools
+
+    return SimulationSummary(trials, tuple(outcome_counts), tuple(histogram), time.perf_counter() - start)
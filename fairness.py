@@ -0,0 +1,235 @@
+"""Testes de qui-quadrado offline sobre um histórico exportado com /exportar (não conecta ao Discord)
+
+Lê o .npz em blocos, sem NumPy e sem carregar o arquivo inteiro na memória, e verifica:
+  - se as faces (1-10) saem com a mesma frequência: em todos os dados, só nos de fome e só
+    nos normais;
+  - se cada dado independe do anterior na mesma rolagem (pares de faces consecutivas: 1º e 2º,
+    3º e 4º...; pares sobrepostos não são independentes e o χ² com 99 graus de liberdade
+    rejeitaria dados justos com frequência maior que α);
+  - a sorte de cada jogador (com correção de Bonferroni, já que são vários testes);
+  - quantas rolagens terminam em falha bestial em cada nível de fome.
+
+Uso:
+    python fairness.py rolagens.npz
+    python fairness.py rolagens.npz --alfa 0.001         # nível de significância mais rígido
+    python fairness.py rolagens.npz --minimo 2000        # dados mínimos para testar um jogador
+"""
+import argparse
+import ast
+import math
+import sys
+import zipfile
+from array import array
+
+FACES = range(1, 11)
+
+# Tipos NumPy gravados pelo bot -> código do array
+TYPECODES = {'<i8': 'q', '<f8': 'd', '<u8': 'Q', '|u1': 'B', '|b1': 'B'}
+
+OUTCOME_BESTIAL_FAILURE = 2
+
+CHUNK_ROWS = 20000
+
+def chi2_sf(statistic, df):
+    """P(X ≥ statistic) para uma qui-quadrado com `df` graus de liberdade (gama incompleta regularizada)"""
+    a = df / 2
+    x = statistic / 2
+    if x <= 0:
+        return 1.0
+    log_scale = -x + a * math.log(x) - math.lgamma(a)
+    if x < a + 1:
+        # Série de P(a, x)
+        term = total = 1 / a
+        n = a
+        while term > total * 1e-15:
+            n += 1
+            term *= x / n
+            total += term
+        return max(0.0, 1 - total * math.exp(log_scale))
+    # Fração contínua de Q(a, x) (método de Lentz)
+    tiny = 1e-300
+    b = x + 1 - a
+    c = 1 / tiny
+    d = 1 / b
+    h = d
+    for i in range(1, 1000):
+        an = -i * (i - a)
+        b += 2
+        d = an * d + b
+        d = tiny if abs(d) < tiny else d
+        c = b + an / c
+        c = tiny if abs(c) < tiny else c
+        d = 1 / d
+        delta = d * c
+        h *= delta
+        if abs(delta - 1) < 1e-15:
+            break
+    return h * math.exp(log_scale)
+
+def chi_square(observed):
+    """(estatística, graus de liberdade, p) contra a distribuição uniforme"""
+    total = sum(observed)
+    expected = total / len(observed)
+    statistic = sum((count - expected) ** 2 for count in observed) / expected
+    df = len(observed) - 1
+    return statistic, df, chi2_sf(statistic, df)
+
+class NpyColumn:
+    """Uma coluna .npy dentro do .npz, lida em blocos de linhas"""
+
+    def __init__(self, archive, name):
+        self.file = archive.open(f'{name}.npy')
+        if self.file.read(6) != b'\x93NUMPY':
+            raise ValueError(f"{name}.npy não é um arquivo .npy")
+        major = self.file.read(2)[0]
+        length = int.from_bytes(self.file.read(2 if major == 1 else 4), 'little')
+        header = ast.literal_eval(self.file.read(length).decode('latin1'))
+        if header['fortran_order'] or header['descr'] not in TYPECODES:
+            raise ValueError(f"{name}.npy: formato não suportado ({header['descr']})")
+        self.typecode = TYPECODES[header['descr']]
+        self.shape = header['shape']
+        self.width = math.prod(self.shape[1:])
+        self.row_size = array(self.typecode).itemsize * self.width
+
+    def read(self, rows):
+        """Próximas `rows` linhas como array (bytes para colunas de um byte)"""
+        size = rows * self.row_size
+        data = bytearray()
+        while len(data) < size:
+            part = self.file.read(size - len(data))
+            if not part:
+                break
+            data += part
+        if self.typecode == 'B':
+            return bytes(data)
+        values = array(self.typecode, data)
+        if sys.byteorder == 'big':
+            values.byteswap()
+        return values
+
+def face_counts(dice):
+    return [dice.count(face) for face in FACES]
+
+def analyze(path):
+    """Percorre o arquivo uma vez e acumula as contagens de todos os testes"""
+    report = {
+        'rolls': 0,
+        'all': [0] * 10,
+        'hunger': [0] * 10,
+        'normal': [0] * 10,
+        'pairs': [0] * 100,
+        'players': {},
+        'by_hunger': {},
+        'criticals': 0,
+        'messy_criticals': 0,
+    }
+    with zipfile.ZipFile(path) as archive:
+        columns = {
+            name: NpyColumn(archive, name)
+            for name in ('user_id', 'dice_count', 'hunger', 'outcome', 'critical', 'messy_critical', 'dice')
+        }
+        width = columns['dice'].width
+        remaining = columns['dice'].shape[0]
+        while remaining:
+            rows = min(CHUNK_ROWS, remaining)
+            remaining -= rows
+            chunk = {name: column.read(rows) for name, column in columns.items()}
+            hunger_dice = bytearray()
+            normal_dice = bytearray()
+            player_dice = {}
+            pairs = report['pairs']
+            for row in range(rows):
+                count = chunk['dice_count'][row]
+                hunger = chunk['hunger'][row]
+                start = row * width
+                dice = chunk['dice'][start:start + count]
+                hunger_dice += dice[:hunger]
+                normal_dice += dice[hunger:]
+                player_dice.setdefault(chunk['user_id'][row], bytearray()).extend(dice)
+                # Pares disjuntos: em um dado ímpar, o último fica de fora
+                for first, second in zip(dice[0::2], dice[1::2]):
+                    pairs[(first - 1) * 10 + second - 1] += 1
+
+                level = report['by_hunger'].setdefault(hunger, [0, 0])
+                level[0] += 1
+                level[1] += chunk['outcome'][row] == OUTCOME_BESTIAL_FAILURE
+
+            for target, dice in (('hunger', hunger_dice), ('normal', normal_dice)):
+                for index, count in enumerate(face_counts(dice)):
+                    report[target][index] += count
+                    report['all'][index] += count
+            for user_id, dice in player_dice.items():
+                totals = report['players'].setdefault(user_id, [0] * 10)
+                for index, count in enumerate(face_counts(dice)):
+                    totals[index] += count
+            report['rolls'] += rows
+            report['criticals'] += sum(chunk['critical'])
+            report['messy_criticals'] += sum(chunk['messy_critical'])
+    return report
+
+def verdict(p_value, alpha):
+    return "✅ compatível com dados justos" if p_value >= alpha else "⚠️ desvio significativo"
+
+def print_test(label, observed, alpha):
+    if sum(observed) == 0:
+        print(f"{label:<28} sem dados")
+        return None
+    statistic, df, p_value = chi_square(observed)
+    print(f"{label:<28} χ² = {statistic:>9.2f}  gl = {df:>2}  p = {p_value:.4f}  {verdict(p_value, alpha)}")
+    return p_value
+
+def run(path, alpha, minimum):
+    report = analyze(path)
+    total_dice = sum(report['all'])
+    print(f"🎲 {report['rolls']} rolagens, {total_dice} dados em {path}\n")
+    if not total_dice:
+        return []
+
+    print("Frequência das faces (todos os dados):")
+    for face, count in zip(FACES, report['all']):
+        print(f"   {face:>2}: {count:>10}  ({count / total_dice:6.2%}, esperado 10.00%)")
+
+    print("\n📊 Qui-quadrado contra a distribuição uniforme")
+    failures = []
+    for label, observed in (
+        ('todos os dados', report['all']),
+        ('dados de fome', report['hunger']),
+        ('dados normais', report['normal']),
+        ('pares consecutivos', report['pairs']),
+    ):
+        p_value = print_test(label, observed, alpha)
+        if p_value is not None and p_value < alpha:
+            failures.append(label)
+
+    players = {user_id: counts for user_id, counts in report['players'].items() if sum(counts) >= minimum}
+    if players:
+        # Bonferroni: com muitos jogadores, alguns p baixos aparecem só por acaso
+        corrected = alpha / len(players)
+        print(f"\n👤 Jogadores com pelo menos {minimum} dados: {len(players)} (α corrigido = {corrected:.2g})")
+        tests = sorted((chi_square(counts)[2], user_id, sum(counts)) for user_id, counts in players.items())
+        for p_value, user_id, dice in tests[:10]:
+            print(f"   {user_id:>20}: {dice:>8} dados  p = {p_value:.4f}  {verdict(p_value, corrected)}")
+        failures.extend(f"jogador {user_id}" for p_value, user_id, _ in tests if p_value < corrected)
+
+    print("\n🩸 Falhas bestiais por nível de fome")
+    for hunger, (rolls, bestial) in sorted(report['by_hunger'].items()):
+        print(f"   fome {hunger}: {bestial:>8} de {rolls:>8} rolagens ({bestial / rolls:6.2%})")
+    print(f"\n💥 Críticos: {report['criticals']} ({report['criticals'] / report['rolls']:.2%}), "
+          f"bagunçados: {report['messy_criticals']} ({report['messy_criticals'] / report['rolls']:.2%})")
+    return failures
+
+def main():
+    parser = argparse.ArgumentParser(description="Testes de qui-quadrado sobre um histórico exportado com /exportar")
+    parser.add_argument('arquivo', help="arquivo .npz gerado pelo /exportar")
+    parser.add_argument('--alfa', type=float, default=0.01, help="nível de significância dos testes")
+    parser.add_argument('--minimo', type=int, default=500, help="dados mínimos para testar a sorte de um jogador")
+    args = parser.parse_args()
+
+    failures = run(args.arquivo, args.alfa, args.minimo)
+    if failures:
+        print(f"\n❌ Desvios significativos em: {', '.join(failures)}")
+        sys.exit(1)
+    print("\n✅ Nenhum desvio significativo")
+
+if __name__ == "__main__":
+    main()
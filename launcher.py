@@ -0,0 +1,173 @@
+"""Launcher com vários processos: divide os shards do bot entre processos na mesma máquina
+
+Cada processo roda o bot.py com SHARD_COUNT/SHARD_IDS próprios (AutoShardedBot) e grava
+um arquivo de saúde por shard. O launcher acompanha esses arquivos, mostra a situação de
+cada shard e reinicia processos que caírem.
+
+O estado por servidor continua correto: o histórico fica em um SQLite compartilhado (WAL)
+e as estatísticas de cada servidor só são carregadas e gravadas pelo processo do seu shard.
+
+Uso:
+    python launcher.py --shards 8 --processos 2
+    python launcher.py --shards auto --processos 4     # quantidade recomendada pelo Discord
+"""
+import argparse
+import json
+import os
+import signal
+import subprocess
+import sys
+import time
+import urllib.request
+
+from dotenv import load_dotenv
+
+BOT_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'bot.py')
+
+# Intervalo entre identificações de shards (limite padrão do Discord: 1 a cada 5 segundos)
+IDENTIFY_INTERVAL = 5.0
+
+# Tempo para cada processo gravar o que tem pendente e sair antes de ser morto
+SHUTDOWN_TIMEOUT = 30.0
+
+def recommended_shard_count(token):
+    """Quantidade de shards recomendada pelo Discord para o bot"""
+    request = urllib.request.Request(
+        'https://discord.com/api/v10/gateway/bot',
+        headers={'Authorization': f'Bot {token}', 'User-Agent': 'vamp-bot-launcher'},
+    )
+    with urllib.request.urlopen(request, timeout=10) as response:
+        return json.load(response)['shards']
+
+def split_shards(shard_count, processes):
+    """Divide os shards em grupos contíguos, um por processo"""
+    processes = min(processes, shard_count)
+    size, extra = divmod(shard_count, processes)
+    groups = []
+    start = 0
+    for index in range(processes):
+        end = start + size + (1 if index < extra else 0)
+        groups.append(list(range(start, end)))
+        start = end
+    return groups
+
+class Worker:
+    def __init__(self, index, shard_ids, shard_count, health_dir):
+        self.index = index
+        self.shard_ids = shard_ids
+        self.shard_count = shard_count
+        self.health_dir = health_dir
+        self.process = None
+        self.restarts = 0
+
+    def start(self):
+        env = dict(os.environ)
+        env.update({
+            'SHARD_COUNT': str(self.shard_count),
+            'SHARD_IDS': ','.join(map(str, self.shard_ids)),
+            'HEALTH_DIR': self.health_dir,
+            # Métricas separadas por processo
+            'METRICS_PATH': env.get('METRICS_PATH', 'vamp_metrics.prom').replace('.prom', f'-{self.index}.prom'),
+        })
+        # Sessão própria: Ctrl+C no terminal chega só ao launcher, que repassa um único SIGINT
+        self.process = subprocess.Popen([sys.executable, BOT_SCRIPT], env=env, start_new_session=True)
+        print(f"🚀 Processo {self.index} (pid {self.process.pid}): shards {self.shard_ids}")
+
+    def alive(self):
+        return self.process is not None and self.process.poll() is None
+
+def read_health(health_dir, shard_id):
+    try:
+        with open(os.path.join(health_dir, f'shard-{shard_id}.json'), encoding='utf-8') as file:
+            return json.load(file)
+    except (OSError, ValueError):
+        return None
+
+def print_status(workers, health_dir, stale_after):
+    now = time.time()
+    print(f"\n📋 Situação dos shards ({time.strftime('%H:%M:%S')})")
+    for worker in workers:
+        state = "ativo" if worker.alive() else "parado"
+        print(f"   Processo {worker.index} [{state}, reinícios: {worker.restarts}]")
+        for shard_id in worker.shard_ids:
+            health = read_health(health_dir, shard_id)
+            if health is None:
+                print(f"      shard {shard_id:>3}: ⏳ sem relatório")
+                continue
+            age = now - health['updated_at']
+            if age > stale_after:
+                status = f"⚠️ relatório atrasado ({age:.0f}s)"
+            elif health['closed']:
+                status = "❌ desconectado"
+            elif not health['ready']:
+                status = "⏳ conectando"
+            else:
+                status = "✅ ok"
+            latency = f"{health['latency'] * 1000:.0f} ms" if health['latency'] is not None else "-"
+            print(f"      shard {shard_id:>3}: {status} | latência {latency} | servidores {health['guilds']}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Roda os shards do bot em vários processos")
+    parser.add_argument('--shards', default='auto', help="total de shards ou 'auto' para o recomendado pelo Discord")
+    parser.add_argument('--processos', type=int, default=os.cpu_count() or 1, help="quantidade de processos")
+    parser.add_argument('--saude', default='shard_health', help="pasta dos arquivos de saúde dos shards")
+    parser.add_argument('--intervalo', type=float, default=30, help="segundos entre relatórios de situação")
+    args = parser.parse_args()
+
+    load_dotenv()
+    if args.shards == 'auto':
+        token = os.getenv('DISCORD_TOKEN')
+        if not token:
+            print("❌ ERRO: Token não encontrado! Defina DISCORD_TOKEN ou informe --shards")
+            sys.exit(1)
+        shard_count = recommended_shard_count(token)
+        print(f"📡 Discord recomenda {shard_count} shards")
+    else:
+        shard_count = int(args.shards)
+
+    os.makedirs(args.saude, exist_ok=True)
+    workers = [
+        Worker(index, shard_ids, shard_count, args.saude)
+        for index, shard_ids in enumerate(split_shards(shard_count, args.processos))
+    ]
+
+    def shutdown(signum, frame):
+        print("\n🛑 Encerrando processos...")
+        # SIGINT (Ctrl+C): o bot fecha a conexão e grava histórico, estatísticas e fichas antes de sair
+        for worker in workers:
+            if worker.alive():
+                worker.process.send_signal(signal.SIGINT)
+        deadline = time.monotonic() + SHUTDOWN_TIMEOUT
+        for worker in workers:
+            if worker.process is None:
+                continue
+            try:
+                worker.process.wait(max(0.0, deadline - time.monotonic()))
+            except subprocess.TimeoutExpired:
+                print(f"⚠️ Processo {worker.index} não saiu em {SHUTDOWN_TIMEOUT:.0f}s; forçando")
+                worker.process.kill()
+                worker.process.wait()
+        sys.exit(0)
+
+    signal.signal(signal.SIGINT, shutdown)
+    signal.signal(signal.SIGTERM, shutdown)
+
+    # Inicia em sequência para não estourar o limite de identificação do gateway
+    for worker in workers:
+        worker.start()
+        time.sleep(IDENTIFY_INTERVAL * len(worker.shard_ids))
+
+    stale_after = 3 * float(os.getenv('HEALTH_INTERVAL', '15'))
+    while True:
+        for worker in workers:
+            if not worker.alive():
+                print(f"💥 Processo {worker.index} saiu com código {worker.process.returncode}; reiniciando")
+                worker.restarts += 1
+                # Espera crescente para não entrar em ciclo de reinício
+                time.sleep(min(60, IDENTIFY_INTERVAL * worker.restarts))
+                worker.start()
+        print_status(workers, args.saude, stale_after)
+        time.sleep(args.intervalo)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,334 @@
+"""Teste de carga local: simula o gateway e as interações do Discord sem conexão
+
+Dispara comandos slash (/vamp, /dados), comandos de texto (!vamp, !di, !ajuda_vamp),
+cliques nos botões do painel e envios do modal de entrada manual com objetos falsos,
+a uma taxa fixa (carga em malha aberta), e mede vazão, erros, tempo até a primeira
+resposta e atraso do loop de eventos.
+
+Uso:
+    python loadtest.py --taxa 500 --duracao 20
+    python loadtest.py --taxa 2000 --latencia-api 0.08 --servidores 500 --paineis 200
+"""
+import argparse
+import asyncio
+import os
+import random
+import tempfile
+import time
+from collections import Counter
+
+# Dados do teste ficam fora do histórico real
+_workdir = tempfile.mkdtemp(prefix='vamp-loadtest-')
+os.environ.setdefault('HISTORY_DB_PATH', os.path.join(_workdir, 'historico.sqlite3'))
+os.environ.setdefault('METRICS_PATH', os.path.join(_workdir, 'metricas.prom'))
+os.environ.setdefault('RNG_SEED_PATH', os.path.join(_workdir, 'semente.seed'))
+
+import bot
+
+# Prazo do Discord para responder uma interação
+INTERACTION_DEADLINE = 3.0
+
+# Peso de cada tipo de evento na mistura
+EVENT_WEIGHTS = {
+    'slash_vamp': 30,
+    'slash_dados': 5,
+    'painel_botao': 35,
+    'painel_rolar': 10,
+    'modal': 5,
+    'texto_vamp': 10,
+    'texto_di': 3,
+    'texto_ajuda': 2,
+}
+
+class LoadStats:
+    def __init__(self):
+        self.started = 0
+        self.completed = 0
+        self.errors = Counter()
+        self.error_replies = 0
+        self.api_calls = Counter()
+        self.first_response = bot.LatencyHistogram()
+        self.end_to_end = bot.LatencyHistogram()
+        self.loop_lag = bot.LatencyHistogram()
+        self.deadline_misses = 0
+        self.max_queue_depth = Counter()
+
+class FakeUser:
+    def __init__(self, user_id):
+        self.id = user_id
+        self.display_name = f"Jogador {user_id}"
+        self.mention = f"<@{user_id}>"
+
+class FakeGuild:
+    def __init__(self, guild_id):
+        self.id = guild_id
+
+class FakeChannel:
+    def __init__(self, channel_id):
+        self.id = channel_id
+        self.mention = f"<#{channel_id}>"
+
+class FakeMessage:
+    def __init__(self, message_id, embeds=()):
+        self.id = message_id
+        self.embeds = list(embeds)
+
+class FakeEvent:
+    """Base dos objetos falsos: mede a primeira resposta e simula a latência da API"""
+
+    # Só interações têm prazo para a primeira resposta
+    deadline = None
+
+    def __init__(self, harness):
+        self.harness = harness
+        self.created = time.perf_counter()
+        self.responded = None
+
+    async def api_call(self, name, content=None):
+        stats = self.harness.stats
+        stats.api_calls[name] += 1
+        if self.responded is None:
+            self.responded = time.perf_counter()
+            elapsed = self.responded - self.created
+            stats.first_response.record(int(elapsed * 1e6))
+            if self.deadline is not None and elapsed > self.deadline:
+                stats.deadline_misses += 1
+        if isinstance(content, str) and content.startswith("❌"):
+            stats.error_replies += 1
+        await asyncio.sleep(self.harness.api_latency)
+
+class FakeResponse:
+    def __init__(self, interaction):
+        self._interaction = interaction
+        self._done = False
+
+    def is_done(self):
+        return self._done
+
+    async def _call(self, name, content=None, **kwargs):
+        if self._done:
+            raise RuntimeError("Interação já respondida")
+        self._done = True
+        await self._interaction.api_call(name, content)
+
+    async def send_message(self, content=None, **kwargs):
+        await self._call('send_message', content)
+
+    async def edit_message(self, **kwargs):
+        if 'embed' in kwargs and self._interaction.message is not None:
+            self._interaction.message.embeds = [kwargs['embed']]
+        await self._call('edit_message')
+
+    async def defer(self, **kwargs):
+        await self._call('defer')
+
+    async def send_modal(self, modal):
+        await self._call('send_modal')
+
+class FakeFollowup:
+    def __init__(self, interaction):
+        self._interaction = interaction
+
+    async def send(self, content=None, **kwargs):
+        await self._interaction.api_call('followup', content)
+
+class FakeInteraction(FakeEvent):
+    deadline = INTERACTION_DEADLINE
+
+    def __init__(self, harness, guild_id, channel_id, user_id, message=None):
+        super().__init__(harness)
+        self.guild_id = guild_id
+        self.channel_id = channel_id
+        self.user = FakeUser(user_id)
+        self.guild = FakeGuild(guild_id)
+        self.channel = FakeChannel(channel_id)
+        self.message = message
+        self.response = FakeResponse(self)
+        self.followup = FakeFollowup(self)
+
+    async def edit_original_response(self, **kwargs):
+        if 'embed' in kwargs and self.message is not None:
+            self.message.embeds = [kwargs['embed']]
+        await self.api_call('edit_original_response')
+
+class FakeContext(FakeEvent):
+    def __init__(self, harness, guild_id, channel_id, user_id):
+        super().__init__(harness)
+        self.guild = FakeGuild(guild_id)
+        self.channel = FakeChannel(channel_id)
+        self.author = FakeUser(user_id)
+
+    async def send(self, content=None, **kwargs):
+        await self.api_call('ctx.send', content)
+
+def fake_roll_origin(source):
+    """roll_origin para os objetos falsos (o do bot reconhece interações pelo tipo discord.Interaction)"""
+    if isinstance(source, FakeInteraction):
+        return source.guild_id, source.channel_id, source.user.id
+    return real_roll_origin(source)
+
+real_roll_origin = bot.roll_origin
+bot.roll_origin = fake_roll_origin
+
+class Harness:
+    def __init__(self, rate, duration, api_latency, guilds, panels):
+        self.rate = rate
+        self.duration = duration
+        self.api_latency = api_latency
+        self.guilds = guilds
+        self.stats = LoadStats()
+        self.panels = [FakeMessage(900000 + index, [bot.DiceConfigView().create_embed()]) for index in range(panels)]
+        self.events = list(EVENT_WEIGHTS)
+        self.weights = list(EVENT_WEIGHTS.values())
+        self.tasks = set()
+
+    def origin(self):
+        guild_id = random.randint(1, self.guilds)
+        return guild_id, guild_id * 100 + random.randint(0, 3), random.randint(1, 5000)
+
+    def interaction(self, message=None):
+        return FakeInteraction(self, *self.origin(), message=message)
+
+    def context(self):
+        return FakeContext(self, *self.origin())
+
+    @staticmethod
+    def pool():
+        dice = random.randint(1, 20)
+        return dice, random.randint(1, 6), random.randint(0, min(5, dice))
+
+    @staticmethod
+    def panel_state(panel):
+        """Estado exibido no painel falso (o mesmo que os custom_ids dos botões carregariam)"""
+        values = {
+            field.name: int(field.value.strip('*'))
+            for field in panel.embeds[0].fields
+            if field.name != bot.TITLE_FIELD_NAME
+        }
+        return values["🎲 Dados"], values["🎯 Dificuldade"], values["🩸 Fome"]
+
+    async def press_panel_button(self, action):
+        panel = random.choice(self.panels)
+        button = bot.DiceConfigButton(action, *self.panel_state(panel))
+        await button.callback(self.interaction(panel))
+
+    async def dispatch(self, event):
+        stats = self.stats
+        stats.started += 1
+        start = time.perf_counter()
+        try:
+            if event == 'slash_vamp':
+                dice, difficulty, hunger = self.pool()
+                command = bot.bot.tree.get_command('vamp')
+                await command.callback(self.interaction(), dados=dice, dificuldade=difficulty, fome=hunger, titulo=random.choice([None, "Garras"]))
+            elif event == 'slash_dados':
+                await bot.bot.tree.get_command('dados').callback(self.interaction())
+            elif event == 'painel_botao':
+                await self.press_panel_button(random.choice(sorted(bot.PANEL_ADJUSTMENTS)))
+            elif event == 'painel_rolar':
+                await self.press_panel_button('roll_dice')
+            elif event == 'modal':
+                modal = bot.DiceRollModal()
+                dice, difficulty, hunger = self.pool()
+                modal.dice_count._value = str(dice)
+                modal.difficulty._value = str(difficulty)
+                modal.hunger._value = str(hunger)
+                modal.title_input._value = ''
+                await modal.on_submit(self.interaction())
+            elif event == 'texto_vamp':
+                expression = random.choice([
+                    "{0} {1} {2}", "{0}/{1}h{2}", '{0}d h{2} dif{1} "Garras"', "{0}/{1}h{2} 5/3 3/2",
+                ]).format(*self.pool())
+                await bot.bot.get_command('vamp').callback(self.context(), expressao=expression)
+            elif event == 'texto_di':
+                await bot.bot.get_command('di').callback(self.context())
+            elif event == 'texto_ajuda':
+                await bot.bot.get_command('ajuda_vamp').callback(self.context())
+            stats.completed += 1
+        except Exception as e:
+            stats.errors[f"{event}: {type(e).__name__}: {e}"] += 1
+        finally:
+            stats.end_to_end.record(int((time.perf_counter() - start) * 1e6))
+
+    async def measure_loop_lag(self, interval=0.01):
+        while True:
+            expected = time.perf_counter() + interval
+            await asyncio.sleep(interval)
+            self.stats.loop_lag.record(int(max(0.0, time.perf_counter() - expected) * 1e6))
+            for lane, depth in bot.outbound.depth().items():
+                self.stats.max_queue_depth[lane] = max(self.stats.max_queue_depth[lane], depth)
+
+    async def run(self):
+        await bot.setup_hook()
+        lag_task = asyncio.get_running_loop().create_task(self.measure_loop_lag())
+
+        # Chegadas em malha aberta: se o bot atrasar, os eventos se acumulam como no gateway
+        start = time.perf_counter()
+        sent = 0
+        total = int(self.rate * self.duration)
+        while sent < total:
+            due = int((time.perf_counter() - start) * self.rate) + 1
+            for event in random.choices(self.events, self.weights, k=min(due, total) - sent):
+                task = asyncio.get_running_loop().create_task(self.dispatch(event))
+                self.tasks.add(task)
+                task.add_done_callback(self.tasks.discard)
+            sent = max(sent, min(due, total))
+            await asyncio.sleep(0.001)
+
+        if self.tasks:
+            await asyncio.wait(self.tasks)
+        # Espera as edições agrupadas do painel e a gravação do histórico
+        await asyncio.sleep(bot.PANEL_COALESCE_WINDOW + 0.1)
+        await bot.roll_history.flush()
+        elapsed = time.perf_counter() - start
+        lag_task.cancel()
+        return elapsed
+
+def print_histogram(label, histogram):
+    p50, p95, p99 = (histogram.percentile(quantile) / 1000 for quantile in (0.5, 0.95, 0.99))
+    print(f"{label:<28} p50 {p50:>8.2f} ms   p95 {p95:>8.2f} ms   p99 {p99:>8.2f} ms   máx {histogram.max / 1000:>8.2f} ms")
+
+def report(harness, elapsed):
+    stats = harness.stats
+    failed = sum(stats.errors.values())
+    print(f"\n🧛 Teste de carga: {stats.started} eventos em {elapsed:.1f}s")
+    print(f"⚡ Vazão: {stats.completed / elapsed:,.0f} eventos/s (alvo {harness.rate:,.0f}/s)")
+    print(f"❌ Erros: {failed} ({failed / max(1, stats.started):.2%}) | Respostas de erro ao usuário: {stats.error_replies}")
+    print(f"⏰ Interações respondidas fora do prazo de {INTERACTION_DEADLINE:.0f}s: {stats.deadline_misses}")
+    depth = " · ".join(f"{lane} {stats.max_queue_depth[lane]}" for lane in bot.LANE_NAMES)
+    print(f"📤 Fila de envio, maior profundidade: {depth}\n")
+    print_histogram("Tempo até a 1ª resposta", stats.first_response)
+    print_histogram("Ponta a ponta", stats.end_to_end)
+    print_histogram("Atraso do loop de eventos", stats.loop_lag)
+
+    print("\n📡 Chamadas à API simulada:")
+    for name, count in stats.api_calls.most_common():
+        print(f"   {name:<24} {count:>8} ({count / elapsed:,.0f}/s)")
+
+    if stats.errors:
+        print("\n🔍 Erros mais comuns:")
+        for error, count in stats.errors.most_common(5):
+            print(f"   {count:>6}× {error}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Teste de carga local do bot, sem conexão com o Discord")
+    parser.add_argument('--taxa', type=float, default=200, help="eventos por segundo")
+    parser.add_argument('--duracao', type=float, default=10, help="duração do envio em segundos")
+    parser.add_argument('--latencia-api', type=float, default=0.05, help="latência simulada de cada chamada à API (s)")
+    parser.add_argument('--servidores', type=int, default=100, help="quantidade de servidores simulados")
+    parser.add_argument('--paineis', type=int, default=50, help="painéis interativos abertos recebendo cliques")
+    parser.add_argument('--seed', type=int, help="semente para repetir a mesma mistura de eventos")
+    args = parser.parse_args()
+
+    if args.seed is not None:
+        random.seed(args.seed)
+
+    async def runner():
+        harness = Harness(args.taxa, args.duracao, args.latencia_api, args.servidores, args.paineis)
+        elapsed = await harness.run()
+        report(harness, elapsed)
+
+    asyncio.run(runner())
+
+if __name__ == "__main__":
+    main()